@@ -0,0 +1,169 @@
+"""Асинхронный путь чтения рецептов, тегов и ингредиентов.
+
+В Django 3.2 нет асинхронного ORM, поэтому запросы к БД выполняются в пуле
+потоков, а независимые запросы одного обращения к API идут параллельно
+через `asyncio.gather`. Представления подключены под `api/async/` и
+рассчитаны на ASGI-сервер (uvicorn): пока запросы ждут ответа БД, процесс
+обслуживает другие обращения, не занимая поток на каждое из них.
+"""
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import Page
+from django.db import close_old_connections
+from django.http import HttpResponse
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+from users.utils import get_subscribed_author_ids
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+
+def database_sync_to_async(func):
+    """Выполняет синхронный код с запросами к БД в общем пуле потоков.
+
+    В отличие от `sync_to_async` по умолчанию, вызовы не выстраиваются в
+    очередь к единственному потоку, поэтому идут параллельно. У каждого
+    потока пула свое соединение с БД; как и обработчик запросов Django,
+    обертка закрывает устаревшие и сломанные соединения до и после вызова.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper, thread_sensitive=False)
+
+
+def render(response):
+    """Рендерит ответ DRF в обычный `HttpResponse`.
+
+    Ответ DRF Django отрендерил бы в единственном потоке для синхронного
+    кода, общем для всех обращений, а готовый `HttpResponse` отдается
+    сразу.
+    """
+    response.render()
+    rendered = HttpResponse(response.content, status=response.status_code)
+    for header, value in response.items():
+        rendered[header] = value
+    return rendered
+
+
+def async_action(viewset_class, action, handler=None):
+    """Асинхронное представление для действия `action` вьюсета.
+
+    Аутентификация, проверка прав и обработка ошибок выполняются так же,
+    как в `APIView.dispatch`. Корутина `handler(view, request, **kwargs)`
+    возвращает `Response`; без нее действие вьюсета целиком выполняется
+    в пуле потоков. Представление только читает данные, поэтому на
+    запросы, кроме GET и HEAD, отвечает 405.
+    """
+    async def view(request, **kwargs):
+        viewset = viewset_class(action_map={'get': action, 'head': action})
+        # Как `ViewSetMixin.as_view`: по обработчикам строится заголовок Allow
+        viewset.http_method_names = list(viewset.action_map)
+        for method in viewset.action_map:
+            setattr(viewset, method, getattr(viewset, action))
+        viewset.args, viewset.kwargs = (), kwargs
+        request = viewset.initialize_request(request, **kwargs)
+        viewset.request = request
+        viewset.headers = viewset.default_response_headers
+        try:
+            if request.method.lower() not in viewset.action_map:
+                viewset.http_method_not_allowed(request)
+            await database_sync_to_async(viewset.initial)(request, **kwargs)
+            if handler is None:
+                response = await database_sync_to_async(
+                    getattr(viewset, action)
+                )(request, **kwargs)
+            else:
+                response = await handler(viewset, request, **kwargs)
+        except Exception as exc:
+            response = viewset.handle_exception(exc)
+        return render(
+            viewset.finalize_response(request, response, **kwargs)
+        )
+    return view
+
+
+async def paginate_recipes(view, request, queryset):
+    """Загружает страницу рецептов, кол-во и подписки параллельно.
+
+    Курсорная пагинация не считает кол-во, а для последней страницы оно
+    нужно заранее, поэтому в этих случаях параллельно с загрузкой
+    страницы идет только загрузка подписок.
+    """
+    load_subscriptions = database_sync_to_async(get_subscribed_author_ids)
+    paginator = view.paginator
+    if not isinstance(paginator, PageNumberPagination):
+        page_number = None
+    else:
+        page_number = request.query_params.get(paginator.page_query_param, 1)
+    if page_number is None or page_number in paginator.last_page_strings:
+        page, _ = await asyncio.gather(
+            database_sync_to_async(paginator.paginate_queryset)(
+                queryset, request, view
+            ),
+            load_subscriptions(request),
+        )
+        return page
+
+    page_size = paginator.get_page_size(request)
+    django_paginator = paginator.django_paginator_class(queryset, page_size)
+    try:
+        page_number = int(page_number)
+        if page_number < 1:
+            raise ValueError
+    except ValueError:
+        raise NotFound(paginator.invalid_page_message)
+    offset = (page_number - 1) * page_size
+    recipes, _, _ = await asyncio.gather(
+        database_sync_to_async(list)(queryset[offset:offset + page_size]),
+        database_sync_to_async(getattr)(django_paginator, 'count'),
+        load_subscriptions(request),
+    )
+    if page_number > django_paginator.num_pages:
+        raise NotFound(paginator.invalid_page_message)
+    paginator.page = Page(recipes, page_number, django_paginator)
+    paginator.request = request
+    return recipes
+
+
+async def list_recipes(view, request):
+    """Лента рецептов.
+
+    Сериализация выполняется в цикле событий: все связанные данные уже
+    загружены, а незамеченный запрос к БД вызовет ошибку
+    `SynchronousOnlyOperation`, а не скрытый N+1.
+    """
+    queryset = await database_sync_to_async(view.filter_queryset)(
+        view.get_queryset()
+    )
+    recipes = await paginate_recipes(view, request, queryset)
+    return view.get_paginated_response(
+        view.get_serializer(recipes, many=True).data
+    )
+
+
+async def retrieve_recipe(view, request, pk):
+    """Рецепт из кеша, а при промахе - рецепт и подписки параллельно."""
+    data = await database_sync_to_async(view.get_cached_recipe)(pk)
+    if data is None:
+        recipe, _ = await asyncio.gather(
+            database_sync_to_async(view.get_object)(),
+            database_sync_to_async(get_subscribed_author_ids)(request),
+        )
+        data = await database_sync_to_async(view.cache_recipe)(recipe)
+    return Response(data)
+
+
+recipe_list = async_action(RecipeViewSet, 'list', list_recipes)
+recipe_detail = async_action(RecipeViewSet, 'retrieve', retrieve_recipe)
+tag_list = async_action(TagViewSet, 'list')
+tag_detail = async_action(TagViewSet, 'retrieve')
+ingredient_list = async_action(IngredientViewSet, 'list')
+ingredient_detail = async_action(IngredientViewSet, 'retrieve')
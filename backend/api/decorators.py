@@ -0,0 +1,63 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.core.cache import cache
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipes.cache import get_cache_version, get_response_timeout
+from recipes.constants import RESPONSE_CACHE_TIMEOUT
+
+
+def cached_response(model, query_params=(), timeout=RESPONSE_CACHE_TIMEOUT):
+    """Кеширует ответ действия вьюсета с проверкой `If-None-Match`.
+
+    Ключ кеша включает версию данных модели, которую сбрасывают сигналы,
+    поэтому при совпадении ETag ответ 304 отдается без обращения к ORM.
+    Кроме версии, ключ строится из действия, параметров пути и только тех
+    параметров запроса из `query_params`, которые читает представление:
+    посторонние параметры не плодят копии одного ответа в кеше.
+    При локальном кеше ответ живет не дольше индекса ингредиентов.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(self, request, *args, **kwargs):
+            key = 'response:{}:{}:{}'.format(
+                model._meta.label_lower,
+                get_cache_version(model),
+                hashlib.md5(json.dumps(
+                    [
+                        view.__name__,
+                        kwargs,
+                        [
+                            request.query_params.get(name)
+                            for name in query_params
+                        ],
+                    ],
+                    sort_keys=True,
+                ).encode()).hexdigest(),
+            )
+            cached = cache.get(key)
+            if cached is None:
+                response = view(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                etag = quote_etag(hashlib.md5(
+                    json.dumps(response.data, sort_keys=True).encode()
+                ).hexdigest())
+                cached = (etag, response.data)
+                cache.set(key, cached, get_response_timeout(timeout))
+            etag, data = cached
+            if_none_match = parse_etags(
+                request.META.get('HTTP_IF_NONE_MATCH', '')
+            )
+            if etag in if_none_match or '*' in if_none_match:
+                return Response(
+                    status=status.HTTP_304_NOT_MODIFIED,
+                    headers={'ETag': etag},
+                )
+            return Response(data, headers={'ETag': etag})
+        return wrapper
+    return decorator
@@ -0,0 +1,157 @@
+import csv
+import io
+import json
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer
+
+
+@lru_cache(maxsize=None)
+def register_pdf_font(path):
+    """Регистрирует TrueType-шрифт в reportlab и возвращает его имя."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    pdfmetrics.registerFont(TTFont(name, path))
+    return name
+
+
+class ShoppingListExporter(BaseRenderer):
+    """Базовый экспортер списка покупок.
+
+    Экспортер одновременно является рендерером DRF, поэтому формат
+    выбирается стандартным согласованием контента по заголовку `Accept`
+    или параметру `?format=`.
+    """
+
+    charset = 'utf-8'
+
+    def header(self):
+        return ''
+
+    def row(self, item):
+        raise NotImplementedError
+
+    def footer(self):
+        return ''
+
+    def stream(self, items):
+        """Построчно отдает файл, не собирая его целиком в памяти."""
+        yield self.header()
+        for item in items:
+            yield self.row(item)
+        yield self.footer()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Рендерит сообщения об ошибках, минуя формат списка покупок."""
+        return json.dumps(data, ensure_ascii=False).encode(
+            self.charset or 'utf-8'
+        )
+
+
+class TextExporter(ShoppingListExporter):
+    """Экспорт списка покупок в текстовый файл."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def header(self):
+        return 'Shopping List:\n\n'
+
+    def row(self, item):
+        return (
+            f"{item['name']}: "
+            f"{item['total_amount']} "
+            f"{item['measurement_unit']}\n"
+        )
+
+
+class CSVExporter(ShoppingListExporter):
+    """Экспорт списка покупок в CSV."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+    fields = ('name', 'total_amount', 'measurement_unit')
+
+    def _write(self, values):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(values)
+        return buffer.getvalue()
+
+    def header(self):
+        return self._write(self.fields)
+
+    def row(self, item):
+        return self._write(item[field] for field in self.fields)
+
+
+class JSONExporter(ShoppingListExporter):
+    """Экспорт списка покупок в JSON."""
+
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, items):
+        yield '['
+        separator = ''
+        for item in items:
+            yield separator + json.dumps(item, ensure_ascii=False)
+            separator = ',\n'
+        yield ']'
+
+
+class PDFExporter(TextExporter):
+    """Экспорт списка покупок в PDF.
+
+    Строки те же, что и в текстовом файле. Таблица смещений объектов PDF
+    пишется в конец файла, поэтому документ собирается целиком и отдается
+    после последней строки; строки при этом по-прежнему читаются курсором.
+    Шрифт с кириллицей задается настройкой `SHOPPING_LIST_PDF_FONT`.
+    """
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    page_size = A4
+    margin = 20 * mm
+    font_size = 12
+    line_height = 18
+
+    def lines(self, items, font):
+        width = self.page_size[0] - 2 * self.margin
+        yield from self.header().splitlines()
+        for item in items:
+            yield from simpleSplit(
+                self.row(item).rstrip(), font, self.font_size, width
+            )
+
+    def stream(self, items):
+        font = register_pdf_font(settings.SHOPPING_LIST_PDF_FONT)
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(
+            buffer, pagesize=self.page_size, pageCompression=1
+        )
+        pdf.setTitle('Shopping List')
+        top = self.page_size[1] - self.margin
+        y = top
+        pdf.setFont(font, self.font_size)
+        for line in self.lines(items, font):
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(font, self.font_size)
+                y = top
+            pdf.drawString(self.margin, y, line)
+            y -= self.line_height
+        pdf.save()
+        yield buffer.getvalue()
+
+
+SHOPPING_LIST_EXPORTERS = (
+    TextExporter, CSVExporter, JSONExporter, PDFExporter
+)
@@ -0,0 +1,133 @@
+import base64
+import binascii
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
+from rest_framework import serializers
+
+from recipes.constants import (ALLOWED_IMAGE_TYPES, BASE64_CHUNK_SIZE,
+                               BASE64_SPOOL_MAX_MEMORY)
+from recipes.images import derivative_srcsets
+
+
+class Base64ImageField(serializers.ImageField):
+    """Поле изображения, принимающее data URI в base64.
+
+    Данные декодируются частями во временный файл, который держится в
+    памяти только до `BASE64_SPOOL_MAX_MEMORY` байт. Размер файла и кол-во
+    пикселей проверяются до того, как Pillow декодирует изображение.
+    """
+
+    default_error_messages = {
+        **serializers.ImageField.default_error_messages,
+        'invalid_data_uri': 'Некорректные данные изображения.',
+        'invalid_type': 'Недопустимый тип изображения: {mime_type}.',
+        'too_large': 'Размер изображения не может быть больше {max_bytes} Б.',
+        'too_many_pixels': (
+            'Изображение не может содержать больше {max_pixels} пикселей.'
+        ),
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('data:'):
+            data = self.decode(data)
+        return super().to_internal_value(data)
+
+    def decode(self, data):
+        header, separator, _ = data[:BASE64_CHUNK_SIZE].partition(';base64,')
+        if not separator:
+            self.fail('invalid_data_uri')
+        mime_type = header[len('data:'):]
+        if mime_type not in ALLOWED_IMAGE_TYPES:
+            self.fail('invalid_type', mime_type=mime_type)
+        start = len(header) + len(separator)
+        max_bytes = settings.BASE64_IMAGE_MAX_BYTES
+        if (len(data) - start) // 4 * 3 > max_bytes:
+            self.fail('too_large', max_bytes=max_bytes)
+
+        file = SpooledTemporaryFile(max_size=BASE64_SPOOL_MAX_MEMORY)
+        try:
+            for offset in range(start, len(data), BASE64_CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    data[offset:offset + BASE64_CHUNK_SIZE], validate=True
+                ))
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_data_uri')
+        file.seek(0)
+        try:
+            self.check_dimensions(file)
+        except serializers.ValidationError:
+            file.close()
+            raise
+        file.seek(0)
+        return File(file, name=f'temp.{ALLOWED_IMAGE_TYPES[mime_type]}')
+
+    def check_dimensions(self, file):
+        """Проверяет кол-во пикселей по заголовку, не декодируя картинку."""
+        try:
+            width, height = Image.open(file).size
+        except (Image.DecompressionBombError, OSError, SyntaxError):
+            self.fail('invalid_image')
+        max_pixels = settings.BASE64_IMAGE_MAX_PIXELS
+        if width * height > max_pixels:
+            self.fail('too_many_pixels', max_pixels=max_pixels)
+
+
+def resolve_ids(queryset, ids):
+    """Загружает объекты по списку id одним запросом.
+
+    Возвращает словарь {id: объект} и отсортированный список id,
+    для которых объект не найден.
+    """
+    objects = queryset.in_bulk(set(ids))
+    return objects, sorted(set(ids) - objects.keys())
+
+
+class BulkPrimaryKeyRelatedField(serializers.ListField):
+    """Список первичных ключей, разрешаемый одним запросом `id__in`.
+
+    В отличие от `PrimaryKeyRelatedField(many=True)` не делает отдельный
+    запрос на каждый ключ и сообщает обо всех ненайденных ключах сразу.
+    """
+
+    default_error_messages = {
+        **serializers.ListField.default_error_messages,
+        'does_not_exist': 'Объекты не существуют: {pk_values}.',
+    }
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        kwargs.setdefault('child', serializers.IntegerField(min_value=1))
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        ids = super().to_internal_value(data)
+        objects, missing = resolve_ids(self.queryset.all(), ids)
+        if missing:
+            self.fail(
+                'does_not_exist',
+                pk_values=', '.join(map(str, missing)),
+            )
+        return [objects[pk] for pk in ids]
+
+    def to_representation(self, value):
+        return [item.pk for item in value.all()]
+
+
+class ImageDerivativesField(serializers.ReadOnlyField):
+    """Ссылки на производные изображения в виде готовых `srcset`."""
+
+    def __init__(self, renditions, **kwargs):
+        self.renditions = renditions
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        return derivative_srcsets(
+            value,
+            self.renditions,
+            request.build_absolute_uri if request else str,
+        )
@@ -1,13 +1,8 @@
 from django_filters.rest_framework import filters, FilterSet
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import OrderingFilter
 
 from recipes.models import Recipe, Tag
-
-
-class IngredientFilter(SearchFilter):
-    """Фильтрация для ингредиентов."""
-
-    search_param = 'name'
+from recipes.search import search_recipes
 
 
 class RecipeFilter(FilterSet):
@@ -24,6 +19,9 @@ class RecipeFilter(FilterSet):
     is_favorited = filters.NumberFilter(
         method='is_favorited_filter'
     )
+    search = filters.CharFilter(
+        method='search_filter'
+    )
 
     class Meta:
         model = Recipe
@@ -32,16 +30,38 @@ class RecipeFilter(FilterSet):
             'author',
             'is_favorited',
             'is_in_shopping_cart',
+            'search',
         )
 
     def is_in_shopping_cart_filter(self, queryset, name, value):
         """Фильтрация для рецептов в списке покупок."""
         if value and self.request.user.is_authenticated:
-            return queryset.filter(shoppingcarts__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
 
     def is_favorited_filter(self, queryset, name, value):
         """Фильтрация для рецептов в избранном."""
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
+
+    def search_filter(self, queryset, name, value):
+        """Полнотекстовый поиск по рецептам."""
+        return search_recipes(queryset, value)
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """Сортировка рецептов по популярности и дате публикации.
+
+    К выбранной сортировке добавляются дата публикации и id, чтобы порядок
+    рецептов с одинаковыми счетчиками был однозначным при пагинации.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        return (*ordering, *(
+            field for field in ('-pub_date', '-id')
+            if field not in ordering and field[1:] not in ordering
+        ))
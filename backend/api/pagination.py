@@ -1,4 +1,15 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
 
 
 class LimitPagination(PageNumberPagination):
@@ -6,3 +17,131 @@ class LimitPagination(PageNumberPagination):
 
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class ApproximateCountPaginator(Paginator):
+    """Пагинатор, оценивающий кол-во объектов на больших выборках.
+
+    В PostgreSQL кол-во строк сначала оценивается планировщиком через
+    EXPLAIN. Если оценка не меньше `PAGINATION_APPROXIMATE_COUNT_THRESHOLD`,
+    она и возвращается вместо точного COUNT(*). Результат кешируется по
+    сигнатуре запроса на `PAGINATION_COUNT_CACHE_TIMEOUT` секунд.
+    """
+
+    count_is_approximate = False
+
+    def _estimate(self, connection, sql, params):
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]['Plan']['Plan Rows']
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.values('pk').order_by()
+        connection = connections[queryset.db]
+        sql, params = queryset.query.get_compiler(
+            connection=connection
+        ).as_sql()
+        key = 'count:' + hashlib.md5(
+            f'{queryset.db}:{sql}:{params}'.encode()
+        ).hexdigest()
+        cached = cache.get(key)
+        if cached is None:
+            estimate = self._estimate(connection, sql, params)
+            if (
+                estimate is not None
+                and estimate >= settings.PAGINATION_APPROXIMATE_COUNT_THRESHOLD
+            ):
+                cached = (estimate, True)
+            else:
+                cached = (queryset.count(), False)
+            cache.set(key, cached, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        count, self.count_is_approximate = cached
+        return count
+
+
+class ApproximateCountPagination(LimitPagination):
+    """Пагинация с приблизительным подсчетом на больших таблицах.
+
+    Поле `count_is_approximate` в ответе показывает, является ли `count`
+    оценкой планировщика.
+    """
+
+    django_paginator_class = ApproximateCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            (
+                'count_is_approximate',
+                self.page.paginator.count_is_approximate,
+            ),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Курсорная пагинация рецептов по дате публикации.
+
+    Не выполняет OFFSET и COUNT(*), поэтому глубокие страницы отдаются
+    так же быстро, как первая.
+    """
+
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        """Возвращает сортировку по умолчанию, а другие из `?ordering=`
+        отклоняет.
+
+        Позиция курсора задается первым полем сортировки, поэтому оно не
+        должно меняться между запросами страниц: при сортировке по
+        счетчикам рецепты пропускались бы или повторялись.
+        """
+        for backend in getattr(view, 'filter_backends', ()):
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering and tuple(ordering) != self.ordering:
+                    raise ValidationError({
+                        'ordering': 'Курсорная пагинация поддерживает '
+                                    'только сортировку по дате публикации.'
+                    })
+        return self.ordering
+
+
+class SubscriptionCursorPagination(CursorPagination):
+    """Курсорная пагинация подписок по имени пользователя."""
+
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('username',)
+
+
+class CursorPaginationMixin:
+    """Включает курсорную пагинацию параметром `?pagination=cursor`.
+
+    По умолчанию используется `pagination_class`, так что формат ответа
+    с `limit`/`page` и полем `count` не меняется.
+    """
+
+    cursor_pagination_class = None
+    pagination_mode_query_param = 'pagination'
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator') and (
+            self.cursor_pagination_class is not None
+            and self.request.query_params.get(
+                self.pagination_mode_query_param
+            ) == 'cursor'
+        ):
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
@@ -1,27 +1,20 @@
-import base64
-
-from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
 from recipes.constants import (MAX_COOKING_TIME, MAX_INGREDIENTS_AMOUNT,
-                               MIN_COOKING_TIME, MIN_INGREDIENTS_AMOUNT)
+                               MIN_COOKING_TIME, MIN_INGREDIENTS_AMOUNT,
+                               RECIPE_IMAGE_RENDITIONS)
+from recipes.images import schedule_derivatives
 from recipes.models import (Favorite, Ingredient, IngredientInRecipe,
-                            Recipe, ShoppingCart, Tag)
+                            Recipe, ShoppingCart, ShoppingCartItem, Tag)
+from recipes.search import update_search_vector
+from .fields import (Base64ImageField, BulkPrimaryKeyRelatedField,
+                     ImageDerivativesField, resolve_ids)
 from users.serializers import RecipeShortSerializer, UserSerializer
 
 
-class Base64ImageField(serializers.ImageField):
-    def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
-        return super().to_internal_value(data)
-
-
 class IngredientSerializer(serializers.ModelSerializer):
     """Сериализатор для ингредиентов."""
 
@@ -48,12 +41,29 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class AddIngredientInRecipeListSerializer(serializers.ListSerializer):
+    """Разрешает id всех ингредиентов рецепта одним запросом."""
+
+    def to_internal_value(self, data):
+        ingredients = super().to_internal_value(data)
+        objects, missing = resolve_ids(
+            Ingredient.objects.all(),
+            [ingredient['id'] for ingredient in ingredients],
+        )
+        if missing:
+            raise serializers.ValidationError(
+                'Ингредиенты не существуют: '
+                f'{", ".join(map(str, missing))}.'
+            )
+        for ingredient in ingredients:
+            ingredient['id'] = objects[ingredient['id']]
+        return ingredients
+
+
 class AddIngredientInRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для добавления ингредиентов в рецепт."""
 
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField(min_value=1)
     amount = serializers.IntegerField(
         min_value=MIN_INGREDIENTS_AMOUNT,
         max_value=MAX_INGREDIENTS_AMOUNT,
@@ -69,6 +79,7 @@ class AddIngredientInRecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = IngredientInRecipe
         fields = ('id', 'amount')
+        list_serializer_class = AddIngredientInRecipeListSerializer
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -89,9 +100,16 @@ class RecipeReceiveSerializer(serializers.ModelSerializer):
         many=True,
         read_only=True,
     )
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
+    is_favorited = serializers.BooleanField(read_only=True, default=False)
+    is_in_shopping_cart = serializers.BooleanField(
+        read_only=True,
+        default=False,
+    )
     image = Base64ImageField()
+    image_set = ImageDerivativesField(
+        source='image',
+        renditions=RECIPE_IMAGE_RENDITIONS,
+    )
 
     class Meta:
         model = Recipe
@@ -104,24 +122,11 @@ class RecipeReceiveSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_set',
             'text',
             'cooking_time',
         )
 
-    def get_is_favorited(self, obj):
-        request = self.context['request']
-        return (
-            request.user.is_authenticated
-            and obj.favorites.filter(user=request.user).exists()
-        )
-
-    def get_is_in_shopping_cart(self, obj):
-        request = self.context['request']
-        return (
-            request.user.is_authenticated
-            and obj.shoppingcarts.filter(user=request.user).exists()
-        )
-
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания рецептов."""
@@ -130,10 +135,12 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         many=True,
         allow_empty=False,
     )
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
-        many=True,
         allow_empty=False,
+        error_messages={
+            'does_not_exist': 'Теги не существуют: {pk_values}.',
+        },
     )
     image = Base64ImageField(
         allow_null=False,
@@ -156,8 +163,12 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         )
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            (instance,), 'tags', 'ingredients_in_recipe__ingredient'
+        )
         return RecipeReceiveSerializer(instance, context=self.context).data
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
@@ -166,17 +177,33 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         )
         self.add_ingredient(ingredients=ingredients, recipe=recipe)
         recipe.tags.set(tags)
+        # Ингредиенты добавлены массовой вставкой, которая не отправляет
+        # сигналов, поэтому поисковый вектор пересчитывается явно
+        update_search_vector((recipe.id,))
+        schedule_derivatives(recipe.image, RECIPE_IMAGE_RENDITIONS)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients', [])
-        tags = validated_data.pop('tags', [])
-
-        instance.ingredients.clear()
-        self.add_ingredient(ingredients=ingredients, recipe=instance)
-        instance.tags.set(tags)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        old_image = instance.image.name
+
+        if ingredients is not None:
+            ShoppingCartItem.objects.apply_recipe_amounts(
+                instance.id,
+                self.update_ingredients(
+                    ingredients=ingredients, recipe=instance
+                ),
+            )
+        if tags is not None:
+            instance.tags.set(tags)
 
-        return super().update(instance, validated_data)
+        # Поисковый вектор пересчитывается сигналом сохранения рецепта
+        instance = super().update(instance, validated_data)
+        if instance.image.name != old_image:
+            schedule_derivatives(instance.image, RECIPE_IMAGE_RENDITIONS)
+        return instance
 
     def add_ingredient(self, ingredients, recipe):
         IngredientInRecipe.objects.bulk_create(
@@ -191,6 +218,57 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             ignore_conflicts=True
         )
 
+    def update_ingredients(self, ingredients, recipe):
+        """Приводит ингредиенты рецепта к переданному списку.
+
+        Затрагиваются только добавленные, измененные и удаленные строки.
+        Возвращает изменение кол-ва по добавленным и измененным
+        ингредиентам: массовые вставка и обновление не отправляют сигналов,
+        а удаленные строки вычитаются из списков покупок сигналом
+        `post_delete`.
+        """
+        rows = {
+            row.ingredient_id: row
+            for row in IngredientInRecipe.objects.filter(recipe=recipe)
+        }
+        old_amounts = {
+            ingredient_id: row.amount
+            for ingredient_id, row in rows.items()
+        }
+        new_amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+
+        to_create = [
+            IngredientInRecipe(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in rows
+        ]
+        to_update = []
+        to_delete = []
+        for ingredient_id, row in rows.items():
+            if ingredient_id not in new_amounts:
+                to_delete.append(row.id)
+            elif row.amount != new_amounts[ingredient_id]:
+                row.amount = new_amounts[ingredient_id]
+                to_update.append(row)
+
+        if to_create:
+            IngredientInRecipe.objects.bulk_create(to_create)
+        if to_update:
+            IngredientInRecipe.objects.bulk_update(to_update, ('amount',))
+        if to_delete:
+            IngredientInRecipe.objects.filter(id__in=to_delete).delete()
+        return {
+            ingredient_id: amount - old_amounts.get(ingredient_id, 0)
+            for ingredient_id, amount in new_amounts.items()
+        }
+
     def validate(self, data):
         ingredients = data.get('ingredients', [])
 
@@ -0,0 +1,1120 @@
+import base64
+import json
+import os
+import re
+import struct
+import tempfile
+import zlib
+from io import BytesIO
+from unittest import mock, skipUnless
+
+import reportlab
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Sum
+from django.test import override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from api.fields import Base64ImageField
+from api.pagination import ApproximateCountPaginator
+from api.serializers import RecipeCreateSerializer
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, ShoppingCartItem, Tag)
+from users.models import Subscription, User
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        first_name=username,
+        last_name=username,
+        password='password',
+    )
+
+
+def create_recipe(author, name, tags, ingredients):
+    """Создает рецепт с тегами и ингредиентами по 10 единиц каждого."""
+    recipe = Recipe.objects.create(
+        author=author,
+        name=name,
+        text=f'Описание рецепта {name}',
+        cooking_time=10,
+        image='recipes/images/recipe.jpg',
+    )
+    recipe.tags.set(tags)
+    IngredientInRecipe.objects.bulk_create(
+        IngredientInRecipe(recipe=recipe, ingredient=ingredient, amount=10)
+        for ingredient in ingredients
+    )
+    return recipe
+
+
+def data_uri(content, mime_type='image/png'):
+    return f'data:{mime_type};base64,{base64.b64encode(content).decode()}'
+
+
+def png(width, height):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'orange').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def png_header(width, height):
+    """PNG из одного заголовка с заданными размерами, без пикселей."""
+    def chunk(kind, data):
+        return (
+            struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data))
+        )
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        + chunk(b'IEND', b'')
+    )
+
+
+INVALID_DATA_URI, INVALID_IMAGE = (
+    str(Base64ImageField.default_error_messages[code])
+    for code in ('invalid_data_uri', 'invalid_image')
+)
+
+
+class RecipeFixturesMixin:
+    """Автор, пользователь, теги, ингредиенты и рецепт автора."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.user = create_user('user')
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {number}', slug=f'tag-{number}')
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(5)
+        ]
+        cls.recipe = create_recipe(
+            cls.author, 'Рецепт', cls.tags[:2], cls.ingredients[:3]
+        )
+
+
+class SharedCacheMixin:
+    """Подменяет кеш в памяти процесса общим файловым кешем."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        shared_cache = self.settings(CACHES={
+            'default': {
+                'BACKEND': (
+                    'django.core.cache.backends.filebased.FileBasedCache'
+                ),
+                'LOCATION': directory.name,
+            },
+        })
+        shared_cache.enable()
+        self.addCleanup(shared_cache.disable)
+
+
+class RecipeDetailCacheTests(
+    SharedCacheMixin, RecipeFixturesMixin, APITestCase
+):
+    """Кеширование детального ответа рецепта при общем кеше."""
+
+    def get_recipe(self):
+        response = self.client.get(
+            reverse('recipes-detail', args=(self.recipe.id,))
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_hit_makes_no_queries(self):
+        data = self.get_recipe()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_recipe(), data)
+
+    def test_hit_overlays_user_flags(self):
+        self.get_recipe()
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(1):
+            data = self.get_recipe()
+        self.assertTrue(data['is_favorited'])
+        self.assertFalse(data['is_in_shopping_cart'])
+        self.assertFalse(data['author']['is_subscribed'])
+
+    def test_miss_for_unknown_recipe(self):
+        response = self.client.get(reverse('recipes-detail', args=(0,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_recipe_change_invalidates(self):
+        self.get_recipe()
+        self.recipe.name = 'Новое название'
+        self.recipe.save()
+        self.assertEqual(self.get_recipe()['name'], 'Новое название')
+
+    def test_recipe_ingredients_change_invalidates(self):
+        self.get_recipe()
+        row = self.recipe.ingredients_in_recipe.first()
+        row.amount = 25
+        row.save()
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in self.get_recipe()['ingredients']
+        }
+        self.assertEqual(amounts[row.ingredient_id], 25)
+
+    def test_recipe_tags_change_invalidates(self):
+        self.get_recipe()
+        self.recipe.tags.add(self.tags[2])
+        self.assertEqual(len(self.get_recipe()['tags']), 3)
+
+    def test_tag_rename_invalidates(self):
+        self.get_recipe()
+        tag = self.tags[0]
+        tag.name = 'Новый тег'
+        tag.save()
+        self.assertIn(
+            'Новый тег', [tag['name'] for tag in self.get_recipe()['tags']]
+        )
+
+    def test_author_change_invalidates(self):
+        self.get_recipe()
+        self.author.first_name = 'Новое имя'
+        self.author.save()
+        self.assertEqual(
+            self.get_recipe()['author']['first_name'], 'Новое имя'
+        )
+
+    def test_patch_invalidates(self):
+        self.get_recipe()
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            reverse('recipes-detail', args=(self.recipe.id,)),
+            {
+                'name': 'Новое название',
+                'tags': [self.tags[2].id],
+                'ingredients': [{'id': self.ingredients[4].id, 'amount': 3}],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        data = self.get_recipe()
+        self.assertEqual(data['name'], 'Новое название')
+        self.assertEqual(
+            [tag['id'] for tag in data['tags']], [self.tags[2].id]
+        )
+        self.assertEqual(
+            [
+                (ingredient['id'], ingredient['amount'])
+                for ingredient in data['ingredients']
+            ],
+            [(self.ingredients[4].id, 3)],
+        )
+
+    def test_user_flags_are_not_shared(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        Subscription.objects.create(user=self.user, author=self.author)
+        self.client.force_authenticate(self.user)
+        data = self.get_recipe()
+        self.assertFalse(data['is_favorited'])
+        self.assertTrue(data['is_in_shopping_cart'])
+        self.assertTrue(data['author']['is_subscribed'])
+        for user in (self.author, None):
+            self.client.force_authenticate(user)
+            data = self.get_recipe()
+            self.assertFalse(data['is_in_shopping_cart'])
+            self.assertFalse(data['author']['is_subscribed'])
+
+
+class RecipeDetailLocalCacheTests(RecipeFixturesMixin, APITestCase):
+    """С кешем в памяти процесса детальный ответ рецепта не кешируется."""
+
+    def test_recipe_is_not_cached(self):
+        url = reverse('recipes-detail', args=(self.recipe.id,))
+        self.client.get(url)
+        # Изменение без сигналов, как если бы его сделал другой процесс
+        Recipe.objects.filter(pk=self.recipe.pk).update(name='Другое')
+        self.assertEqual(self.client.get(url).json()['name'], 'Другое')
+
+
+class RecipeListQueriesTests(RecipeFixturesMixin, APITestCase):
+    """Кол-во запросов ленты рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        authors = [create_user(f'author-{number}') for number in range(5)]
+        for number in range(60):
+            recipe = create_recipe(
+                authors[number % len(authors)],
+                f'Рецепт {number}',
+                cls.tags[number % 3:],
+                cls.ingredients[number % 5:],
+            )
+            if number % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if number % 3:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Subscription.objects.bulk_create(
+            Subscription(user=cls.user, author=author)
+            for author in authors[:2]
+        )
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        # Кол-во (EXPLAIN и COUNT), рецепты, теги, ингредиенты рецептов,
+        # сами ингредиенты и подписки пользователя. Оценку кол-ва через
+        # EXPLAIN пагинатор запрашивает только в PostgreSQL.
+        queries = 7 if connection.vendor == 'postgresql' else 6
+        self.client.force_authenticate(self.user)
+        for limit in (20, 50):
+            with self.subTest(limit=limit):
+                # Кол-во рецептов кешируется по сигнатуре запроса
+                cache.clear()
+                with self.assertNumQueries(queries):
+                    response = self.client.get(
+                        reverse('recipes-list'), {'limit': limit}
+                    )
+                self.assertEqual(len(response.json()['results']), limit)
+
+    def test_user_flags(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('recipes-list'), {'limit': 100})
+        favorited = set(
+            Favorite.objects.filter(user=self.user).values_list(
+                'recipe_id', flat=True
+            )
+        )
+        in_cart = set(
+            ShoppingCart.objects.filter(user=self.user).values_list(
+                'recipe_id', flat=True
+            )
+        )
+        subscribed = set(
+            Subscription.objects.filter(user=self.user).values_list(
+                'author_id', flat=True
+            )
+        )
+        for recipe in response.json()['results']:
+            self.assertEqual(
+                recipe['is_favorited'], recipe['id'] in favorited
+            )
+            self.assertEqual(
+                recipe['is_in_shopping_cart'], recipe['id'] in in_cart
+            )
+            self.assertEqual(
+                recipe['author']['is_subscribed'],
+                recipe['author']['id'] in subscribed,
+            )
+
+
+class ApproximateCountPaginationTests(RecipeFixturesMixin, APITestCase):
+    """Оценка кол-ва рецептов планировщиком вместо COUNT(*)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for number in range(4):
+            create_recipe(cls.author, f'Рецепт {number}', (), ())
+
+    def setUp(self):
+        cache.clear()
+
+    def get_count(self, estimate):
+        with mock.patch.object(
+            ApproximateCountPaginator, '_estimate', return_value=estimate
+        ) as estimate_count:
+            data = self.client.get(reverse('recipes-list')).json()
+        self.assertEqual(estimate_count.call_count, 1)
+        return data['count'], data['count_is_approximate']
+
+    @override_settings(PAGINATION_APPROXIMATE_COUNT_THRESHOLD=100)
+    def test_large_estimate_is_returned(self):
+        self.assertEqual(self.get_count(1000), (1000, True))
+
+    @override_settings(PAGINATION_APPROXIMATE_COUNT_THRESHOLD=100)
+    def test_small_estimate_is_counted_exactly(self):
+        self.assertEqual(self.get_count(99), (5, False))
+        cache.clear()
+        # Оценки нет, если СУБД не PostgreSQL
+        self.assertEqual(self.get_count(None), (5, False))
+
+    @override_settings(PAGINATION_APPROXIMATE_COUNT_THRESHOLD=100)
+    def test_count_is_cached(self):
+        self.get_count(1000)
+        with mock.patch.object(
+            ApproximateCountPaginator, '_estimate'
+        ) as estimate_count:
+            data = self.client.get(reverse('recipes-list')).json()
+        estimate_count.assert_not_called()
+        self.assertEqual(data['count'], 1000)
+        self.assertTrue(data['count_is_approximate'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Нужен PostgreSQL')
+    @override_settings(PAGINATION_APPROXIMATE_COUNT_THRESHOLD=0)
+    def test_planner_estimate(self):
+        paginator = ApproximateCountPaginator(Recipe.objects.all(), 10)
+        self.assertIsInstance(paginator.count, int)
+        self.assertTrue(paginator.count_is_approximate)
+
+
+class RecipeCursorPaginationTests(RecipeFixturesMixin, APITestCase):
+    """Курсорная пагинация ленты рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for number in range(8):
+            create_recipe(cls.author, f'Рецепт {number}', (), ())
+        # У половины рецептов одинаковая дата публикации
+        Recipe.objects.filter(
+            name__in=[f'Рецепт {number}' for number in range(2, 7)]
+        ).update(pub_date=cls.recipe.pub_date)
+
+    def get_pages(self, **params):
+        ids = []
+        url = reverse('recipes-list')
+        params = {'pagination': 'cursor', 'limit': 2, **params}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertNotIn('count', data)
+            ids.extend(recipe['id'] for recipe in data['results'])
+            url, params = data['next'], None
+        return ids
+
+    def test_pages_follow_publication_order(self):
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True))
+        self.assertEqual(self.get_pages(), expected)
+        self.assertEqual(self.get_pages(ordering='-pub_date'), expected)
+
+    def test_other_ordering_is_rejected(self):
+        for ordering in ('-favorites_count', 'pub_date'):
+            with self.subTest(ordering=ordering):
+                response = self.client.get(reverse('recipes-list'), {
+                    'pagination': 'cursor', 'ordering': ordering,
+                })
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('ordering', response.json())
+
+
+class CachedResponseTests(APITestCase):
+    """Кеширование ответов справочников и проверка ETag."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+
+    def setUp(self):
+        ingredient_index.invalidate()
+        cache.clear()
+
+    def test_not_modified(self):
+        url = reverse('tags-list')
+        response = self.client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_change_invalidates(self):
+        url = reverse('tags-detail', args=(self.tag.id,))
+        etag = self.client.get(url)['ETag']
+        self.tag.name = 'Ужин'
+        self.tag.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['name'], 'Ужин')
+
+    def test_key_ignores_unused_params(self):
+        url = reverse('tags-list')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'unused': 1, 'page': 2})
+        self.assertEqual(len(response.json()), 1)
+        url = reverse('ingredients-list')
+        self.assertEqual(len(self.client.get(url, {'name': 'со'}).json()), 1)
+        self.assertEqual(self.client.get(url, {'name': 'xyz'}).json(), [])
+
+    def test_missing_object_is_not_cached(self):
+        pk = self.tag.id + 1000
+        url = reverse('tags-detail', args=(pk,))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        Tag.objects.create(pk=pk, name='Обед', slug='lunch')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class IngredientSearchTests(APITestCase):
+    """Автодополнение ингредиентов по индексу в памяти."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('Соль', 'Морская соль', 'Соль крупная', 'Сахар'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        # Индекс процесса мог остаться от данных, откаченных другим тестом
+        ingredient_index.invalidate()
+        cache.clear()
+
+    def search(self, name):
+        response = self.client.get(reverse('ingredients-list'), {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_prefix_matches_first(self):
+        self.assertEqual(
+            self.search('соль'), ['Соль', 'Соль крупная', 'Морская соль']
+        )
+
+    def test_prefix_only(self):
+        self.assertEqual(
+            [
+                ingredient['name']
+                for ingredient in ingredient_index.search('соль', False)
+            ],
+            ['Соль', 'Соль крупная'],
+        )
+
+    def test_search_makes_no_queries(self):
+        self.search('с')
+        # Ответ на новый запрос не закеширован, поиск идет по индексу
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('сах'), ['Сахар'])
+
+    def test_changes_invalidate_index(self):
+        self.search('с')
+        Ingredient.objects.create(name='Сахарная пудра', measurement_unit='г')
+        Ingredient.objects.filter(name='Сахар').get().delete()
+        self.assertEqual(self.search('сах'), ['Сахарная пудра'])
+
+
+class ShoppingCartItemsTests(RecipeFixturesMixin, APITestCase):
+    """Итоги списка покупок при изменениях вне API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_author = create_user('other-author')
+        cls.other_recipe = create_recipe(
+            cls.other_author, 'Другой рецепт', cls.tags[:1],
+            cls.ingredients[1:4],
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        for recipe in (self.recipe, self.other_recipe):
+            response = self.client.post(
+                reverse('recipes-shopping-cart', args=(recipe.id,))
+            )
+            self.assertEqual(response.status_code, 201)
+
+    def assertTotalsMatchCart(self):
+        expected = dict(
+            IngredientInRecipe.objects.filter(
+                recipe__shoppingcarts__user=self.user
+            ).values('ingredient').annotate(
+                total=Sum('amount')
+            ).values_list('ingredient', 'total')
+        )
+        self.assertEqual(
+            dict(
+                ShoppingCartItem.objects.filter(user=self.user).values_list(
+                    'ingredient', 'total_amount'
+                )
+            ),
+            expected,
+        )
+
+    def test_added_from_api(self):
+        self.assertTotalsMatchCart()
+        self.assertEqual(
+            ShoppingCartItem.objects.get(
+                user=self.user, ingredient=self.ingredients[1]
+            ).total_amount,
+            20,
+        )
+
+    def test_recipe_deleted_outside_api(self):
+        self.recipe.delete()
+        self.assertTotalsMatchCart()
+
+    def test_author_deleted(self):
+        self.other_author.delete()
+        self.assertTotalsMatchCart()
+
+    def test_ingredient_deleted(self):
+        self.ingredients[1].delete()
+        self.assertTotalsMatchCart()
+
+    def test_recipe_ingredients_edited_outside_api(self):
+        row = self.recipe.ingredients_in_recipe.get(
+            ingredient=self.ingredients[0]
+        )
+        row.amount = 35
+        row.save()
+        row = self.recipe.ingredients_in_recipe.get(
+            ingredient=self.ingredients[1]
+        )
+        row.ingredient = self.ingredients[4]
+        row.save()
+        self.recipe.ingredients_in_recipe.get(
+            ingredient=self.ingredients[2]
+        ).delete()
+        IngredientInRecipe.objects.create(
+            recipe=self.recipe, ingredient=self.ingredients[3], amount=7
+        )
+        self.assertTotalsMatchCart()
+
+    def test_recipe_ingredients_updated_from_api(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            reverse('recipes-detail', args=(self.recipe.id,)),
+            {
+                'tags': [tag.id for tag in self.tags[:2]],
+                'ingredients': [
+                    {'id': self.ingredients[0].id, 'amount': 10},
+                    {'id': self.ingredients[1].id, 'amount': 30},
+                    {'id': self.ingredients[4].id, 'amount': 5},
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTotalsMatchCart()
+
+    def test_removed_from_cart(self):
+        url = reverse('recipes-shopping-cart', args=(self.recipe.id,))
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertTotalsMatchCart()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.in_carts_count, 0)
+
+    def test_download_after_recipe_deleted(self):
+        self.recipe.delete()
+        self.other_recipe.delete()
+        response = self.client.get(
+            reverse('recipes-download-shopping-cart'), {'format': 'txt'}
+        )
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode()
+        self.assertNotIn('Ингредиент', content)
+
+
+class ShoppingListExportTests(APITestCase):
+    """Выгрузка списка покупок во всех форматах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        author = create_user('author')
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number:02}', measurement_unit='шт'
+            )
+            for number in range(60)
+        ]
+        recipe = create_recipe(author, 'Рецепт', (), ingredients)
+        ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def download(self, export_format):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(
+            reverse('recipes-download-shopping-cart'),
+            {'format': export_format},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Disposition'],
+            f'attachment; filename="shopping_list.{export_format}"',
+        )
+        return response, b''.join(response.streaming_content)
+
+    def test_txt(self):
+        response, content = self.download('txt')
+        self.assertEqual(
+            response['Content-Type'], 'text/plain; charset=utf-8'
+        )
+        lines = content.decode().splitlines()
+        self.assertEqual(lines[:3], [
+            'Shopping List:', '', 'Ингредиент 00: 10 шт'
+        ])
+        self.assertEqual(len(lines), 62)
+
+    def test_csv(self):
+        response, content = self.download('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = content.decode().splitlines()
+        self.assertEqual(lines[:2], [
+            'name,total_amount,measurement_unit', 'Ингредиент 00,10,шт'
+        ])
+
+    def test_json(self):
+        response, content = self.download('json')
+        self.assertEqual(
+            response['Content-Type'], 'application/json; charset=utf-8'
+        )
+        items = json.loads(content)
+        self.assertEqual(len(items), 60)
+        self.assertEqual(items[0], {
+            'name': 'Ингредиент 00',
+            'measurement_unit': 'шт',
+            'total_amount': 10,
+        })
+
+    def test_pdf(self):
+        font = os.path.join(
+            os.path.dirname(reportlab.__file__), 'fonts', 'Vera.ttf'
+        )
+        with self.settings(SHOPPING_LIST_PDF_FONT=font):
+            response, content = self.download('pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(content.startswith(b'%PDF-'))
+        self.assertTrue(content.rstrip().endswith(b'%%EOF'))
+        # 62 строки не помещаются на одну страницу A4
+        self.assertEqual(len(re.findall(rb'/Type /Page\b', content)), 2)
+
+
+class ShoppingListUnitsTests(APITestCase):
+    """Перевод итогов списка покупок в крупные единицы."""
+
+    def test_amounts_use_readable_units(self):
+        user = create_user('user')
+        recipe = create_recipe(create_user('author'), 'Рецепт', (), ())
+        for name, unit, amount in (
+            ('Вода', 'L', 1),
+            ('Молоко', 'мл', 250),
+            ('Мука', 'г', 1500),
+            ('Сахар', 'кг', 2),
+            ('Соль', 'г', 1234),
+            ('Яйцо', 'шт.', 3),
+        ):
+            IngredientInRecipe.objects.create(
+                recipe=recipe,
+                ingredient=Ingredient.objects.create(
+                    name=name, measurement_unit=unit
+                ),
+                amount=amount,
+            )
+        ShoppingCart.objects.create(user=user, recipe=recipe)
+        self.client.force_authenticate(user)
+        response = self.client.get(
+            reverse('recipes-download-shopping-cart'), {'format': 'json'}
+        )
+        self.assertEqual(
+            [
+                (item['name'], item['total_amount'], item['measurement_unit'])
+                for item in json.loads(b''.join(response.streaming_content))
+            ],
+            [
+                ('Вода', 1, 'L'),
+                ('Молоко', 250, 'мл'),
+                ('Мука', 1.5, 'кг'),
+                ('Сахар', 2, 'кг'),
+                ('Соль', 1234, 'г'),
+                ('Яйцо', 3, 'шт.'),
+            ],
+        )
+
+
+class RecipeSearchTests(RecipeFixturesMixin, APITestCase):
+    """Поиск рецептов по названию, описанию и ингредиентам.
+
+    Стемминг, ранжирование и поиск с опечатками есть только в PostgreSQL,
+    в остальных СУБД проверяется поиск по вхождению подстроки.
+    """
+
+    def search(self, value):
+        response = self.client.get(reverse('recipes-list'), {'search': value})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.json()['results']]
+
+    def create_borscht(self):
+        recipe = Recipe.objects.create(
+            author=self.author,
+            name='Борщ',
+            text='Суп со свеклой',
+            cooking_time=60,
+            image='recipes/images/recipe.jpg',
+        )
+        IngredientInRecipe.objects.create(
+            recipe=recipe,
+            ingredient=Ingredient.objects.create(
+                name='Капуста', measurement_unit='г'
+            ),
+            amount=300,
+        )
+        return recipe
+
+    @skipUnless(connection.vendor == 'postgresql', 'Нужен PostgreSQL')
+    def test_recipe_created_outside_api_is_found(self):
+        self.create_borscht()
+        self.assertEqual(self.search('борщ'), ['Борщ'])
+        self.assertEqual(self.search('свекла'), ['Борщ'])
+        self.assertEqual(self.search('капуста'), ['Борщ'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Нужен PostgreSQL')
+    def test_recipe_renamed_outside_api_is_found(self):
+        self.recipe.name = 'Солянка'
+        self.recipe.save()
+        self.assertEqual(self.search('солянка'), ['Солянка'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Нужен PostgreSQL')
+    def test_typo_falls_back_to_trigram_similarity(self):
+        self.recipe.name = 'Борщ'
+        self.recipe.save()
+        self.assertEqual(self.search('Боршч'), ['Борщ'])
+
+    @mock.patch('recipes.search.is_full_text_supported', return_value=False)
+    def test_substring_fallback(self, is_full_text_supported):
+        self.create_borscht()
+        self.assertEqual(self.search('Борщ'), ['Борщ'])
+        self.assertEqual(self.search('свекл'), ['Борщ'])
+        self.assertEqual(self.search('Капуст'), ['Борщ'])
+        self.assertEqual(self.search('Солянка'), [])
+
+
+class RecipeUpdateQueriesTests(RecipeFixturesMixin, APITestCase):
+    """Кол-во запросов PATCH рецепта.
+
+    Поисковый вектор пересчитывается только в PostgreSQL, и эти UPDATE
+    учитываются отдельно.
+    """
+
+    def search_vector_updates(self, count):
+        return count if connection.vendor == 'postgresql' else 0
+
+    def patch_recipe(self, queries, **data):
+        payload = {
+            'name': self.recipe.name,
+            'text': self.recipe.text,
+            'cooking_time': self.recipe.cooking_time,
+            'tags': [tag.id for tag in self.tags[:2]],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in self.ingredients[:3]
+            ],
+            **data,
+        }
+        self.client.force_authenticate(self.author)
+        with self.assertNumQueries(queries):
+            response = self.client.patch(
+                reverse('recipes-detail', args=(self.recipe.id,)),
+                payload,
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_title_only(self):
+        # Рецепт, проверка ингредиентов и тегов, текущие ингредиенты и теги
+        # рецепта, UPDATE рецепта и его поискового вектора, точки
+        # сохранения, ответ (теги, ингредиенты рецепта, ингредиенты) и
+        # подписки. Ингредиенты и теги не перезаписываются.
+        self.patch_recipe(
+            12 + self.search_vector_updates(1), name='Новое название'
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'Новое название')
+
+    def test_ingredients_diff(self):
+        # К запросам выше добавляются INSERT нового ингредиента, UPDATE
+        # измененного, выборка и DELETE удаленного с пересчетом поискового
+        # вектора и поиск корзин с рецептом для удаленного и измененных.
+        self.patch_recipe(18 + self.search_vector_updates(2), ingredients=[
+            {'id': self.ingredients[0].id, 'amount': 10},
+            {'id': self.ingredients[1].id, 'amount': 20},
+            {'id': self.ingredients[3].id, 'amount': 5},
+        ])
+        self.assertEqual(
+            dict(
+                self.recipe.ingredients_in_recipe.values_list(
+                    'ingredient_id', 'amount'
+                )
+            ),
+            {
+                self.ingredients[0].id: 10,
+                self.ingredients[1].id: 20,
+                self.ingredients[3].id: 5,
+            },
+        )
+
+
+class RecipeRelatedIdsTests(RecipeFixturesMixin, APITestCase):
+    """Разрешение id ингредиентов и тегов рецепта."""
+
+    def validate(self, ingredient_ids, tag_ids):
+        serializer = RecipeCreateSerializer(
+            self.recipe,
+            data={
+                'ingredients': [
+                    {'id': pk, 'amount': 5} for pk in ingredient_ids
+                ],
+                'tags': tag_ids,
+            },
+            partial=True,
+        )
+        return serializer.is_valid(), serializer.errors
+
+    def test_query_count_does_not_depend_on_ids_count(self):
+        for count in (1, 5):
+            with self.subTest(count=count):
+                # Ингредиенты и теги загружаются одним запросом каждые
+                with self.assertNumQueries(2):
+                    is_valid, errors = self.validate(
+                        [item.id for item in self.ingredients[:count]],
+                        [tag.id for tag in self.tags[:count]],
+                    )
+                self.assertTrue(is_valid, errors)
+
+    def test_missing_ids_are_reported_together(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            reverse('recipes-detail', args=(self.recipe.id,)),
+            {
+                'ingredients': [
+                    {'id': 1000002, 'amount': 5},
+                    {'id': self.ingredients[0].id, 'amount': 5},
+                    {'id': 1000001, 'amount': 5},
+                ],
+                'tags': [self.tags[0].id, 1000003],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {
+            'ingredients': ['Ингредиенты не существуют: 1000001, 1000002.'],
+            'tags': ['Теги не существуют: 1000003.'],
+        })
+
+
+class SubscriptionRecipesPreviewTests(APITestCase):
+    """Последние рецепты авторов в списке подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.authors = [create_user(f'author-{number}') for number in range(8)]
+        for author in cls.authors:
+            for number in range(5):
+                create_recipe(author, f'{author.username} {number}', (), ())
+        Subscription.objects.bulk_create(
+            Subscription(user=cls.user, author=author)
+            for author in cls.authors
+        )
+
+    def get_subscriptions(self, queries, **params):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(queries):
+            response = self.client.get(
+                reverse('users-subscriptions'), params
+            )
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_recipes_limit(self):
+        for limit in (1, 3):
+            with self.subTest(limit=limit):
+                # Кол-во, авторы, рецепты и подписки пользователя
+                results = self.get_subscriptions(
+                    4, limit=6, recipes_limit=limit
+                )
+                self.assertEqual(len(results), 6)
+                for result in results:
+                    expected = Recipe.objects.filter(
+                        author_id=result['id']
+                    ).order_by('-pub_date', '-id')[:limit]
+                    self.assertEqual(
+                        [recipe['id'] for recipe in result['recipes']],
+                        [recipe.id for recipe in expected],
+                    )
+
+    def test_without_limit(self):
+        results = self.get_subscriptions(4, limit=6)
+        for result in results:
+            self.assertEqual(len(result['recipes']), 5)
+
+
+class CountersTests(RecipeFixturesMixin, APITestCase):
+    """Счетчики пользователей и рецептов при изменениях в API и вне его."""
+
+    def assertCounters(self, instance, **expected):
+        instance.refresh_from_db()
+        self.assertEqual(
+            {field: getattr(instance, field) for field in expected}, expected
+        )
+
+    def test_subscription(self):
+        self.client.force_authenticate(self.user)
+        url = reverse('users-subscribe', args=(self.author.id,))
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertCounters(self.user, following_count=1)
+        self.assertCounters(self.author, followers_count=1)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertCounters(self.user, following_count=0)
+        self.assertCounters(self.author, followers_count=0)
+
+    def test_subscriber_deleted(self):
+        Subscription.objects.create(user=self.user, author=self.author)
+        self.assertCounters(self.author, followers_count=1)
+        self.user.delete()
+        self.assertCounters(self.author, followers_count=0)
+
+    def test_recipes_count(self):
+        self.assertCounters(self.author, recipes_count=1)
+        create_recipe(self.author, 'Второй рецепт', (), ())
+        self.assertCounters(self.author, recipes_count=2)
+        self.client.force_authenticate(self.author)
+        response = self.client.delete(
+            reverse('recipes-detail', args=(self.recipe.id,))
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertCounters(self.author, recipes_count=1)
+
+    def test_favorites_count(self):
+        self.client.force_authenticate(self.user)
+        url = reverse('recipes-favorite', args=(self.recipe.id,))
+        self.assertEqual(self.client.post(url).status_code, 201)
+        Favorite.objects.create(user=self.author, recipe=self.recipe)
+        self.assertCounters(self.recipe, favorites_count=2)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        Favorite.objects.filter(user=self.author).delete()
+        self.assertCounters(self.recipe, favorites_count=0)
+
+
+class AsyncViewsTests(RecipeFixturesMixin, APITransactionTestCase):
+    """Асинхронный путь чтения отвечает так же, как синхронный.
+
+    Асинхронные представления обращаются к БД из пула потоков со своими
+    соединениями, поэтому тесты выполняются вне транзакции, а данные
+    создаются заново для каждого теста.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.setUpTestData()
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        Subscription.objects.create(user=self.user, author=self.author)
+        self.client.force_authenticate(self.user)
+
+    def test_same_responses(self):
+        for name, args, params in (
+            ('recipes-list', (), {}),
+            ('recipes-list', (), {'limit': 1, 'page': 1}),
+            ('recipes-list', (), {'is_favorited': 1}),
+            ('recipes-list', (), {'pagination': 'cursor'}),
+            ('recipes-detail', (self.recipe.id,), {}),
+            ('recipes-detail', (0,), {}),
+            ('tags-list', (), {}),
+            ('tags-detail', (self.tags[0].id,), {}),
+            ('ingredients-list', (), {'name': 'Ингр'}),
+            ('ingredients-detail', (self.ingredients[0].id,), {}),
+        ):
+            with self.subTest(name=name, args=args, params=params):
+                expected = self.client.get(reverse(name, args=args), params)
+                response = self.client.get(
+                    reverse(f'async-{name}', args=args), params
+                )
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.json(), expected.json())
+
+    def test_write_methods_not_allowed(self):
+        url = reverse('async-recipes-detail', args=(self.recipe.id,))
+        for method in ('post', 'put', 'patch', 'delete'):
+            with self.subTest(method=method):
+                response = getattr(self.client, method)(url)
+                self.assertEqual(response.status_code, 405)
+                self.assertEqual(response['Allow'], 'GET, HEAD')
+        self.assertTrue(Recipe.objects.filter(pk=self.recipe.pk).exists())
+        response = self.client.post(reverse('async-tags-list'))
+        self.assertEqual(response.status_code, 405)
+
+
+class Base64ImageFieldTests(RecipeFixturesMixin, APITestCase):
+    """Ограничения изображения рецепта, переданного в base64."""
+
+    def create_recipe(self, image):
+        self.client.force_authenticate(self.author)
+        response = self.client.post(
+            reverse('recipes-list'),
+            {
+                'name': 'Новый рецепт',
+                'text': 'Описание',
+                'cooking_time': 10,
+                'tags': [self.tags[0].id],
+                'ingredients': [{'id': self.ingredients[0].id, 'amount': 5}],
+                'image': image,
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Recipe.objects.filter(name='Новый рецепт').exists())
+        return response.json()['image']
+
+    @override_settings(BASE64_IMAGE_MAX_BYTES=1000)
+    def test_too_large(self):
+        self.assertEqual(
+            self.create_recipe(data_uri(os.urandom(2000))),
+            ['Размер изображения не может быть больше 1000 Б.'],
+        )
+
+    @override_settings(BASE64_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels(self):
+        self.assertEqual(
+            self.create_recipe(data_uri(png(20, 10))),
+            ['Изображение не может содержать больше 100 пикселей.'],
+        )
+
+    def test_decompression_bomb(self):
+        # Размеры берутся из заголовка, пиксели не декодируются. Слишком
+        # большие размеры Pillow отклоняет сам при открытии файла.
+        for width, height, message in (
+            (
+                10000, 10000,
+                'Изображение не может содержать больше 25000000 пикселей.',
+            ),
+            (100000, 100000, INVALID_IMAGE),
+        ):
+            with self.subTest(width=width, height=height):
+                self.assertEqual(
+                    self.create_recipe(data_uri(png_header(width, height))),
+                    [message],
+                )
+
+    def test_disallowed_type(self):
+        self.assertEqual(
+            self.create_recipe(data_uri(b'<svg/>', 'image/svg+xml')),
+            ['Недопустимый тип изображения: image/svg+xml.'],
+        )
+
+    def test_invalid_data(self):
+        for image, message in (
+            ('data:image/png;base64,@@@@', INVALID_DATA_URI),
+            (
+                'data:image/png,' + base64.b64encode(png(1, 1)).decode(),
+                INVALID_DATA_URI,
+            ),
+            (data_uri(b'not an image'), INVALID_IMAGE),
+        ):
+            with self.subTest(image=image[:30]):
+                self.assertEqual(self.create_recipe(image), [message])
@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
 from .views import IngredientViewSet, RecipeViewSet, TagViewSet
 from users.views import LoginView, LogoutView, UserViewSet
 
@@ -18,7 +19,31 @@ router_v1.register(
     'tags', TagViewSet, basename='tags'
 )
 
+async_urlpatterns = [
+    path(
+        'recipes/', async_views.recipe_list, name='async-recipes-list'
+    ),
+    path(
+        'recipes/<int:pk>/',
+        async_views.recipe_detail,
+        name='async-recipes-detail',
+    ),
+    path('tags/', async_views.tag_list, name='async-tags-list'),
+    path('tags/<int:pk>/', async_views.tag_detail, name='async-tags-detail'),
+    path(
+        'ingredients/',
+        async_views.ingredient_list,
+        name='async-ingredients-list',
+    ),
+    path(
+        'ingredients/<int:pk>/',
+        async_views.ingredient_detail,
+        name='async-ingredients-detail',
+    ),
+]
+
 urlpatterns = [
+    path('async/', include(async_urlpatterns)),
     path('', include(router_v1.urls)),
     path('auth/token/login/', LoginView.as_view(), name='login'),
     path('auth/token/logout/', LogoutView.as_view(), name='logout'),
@@ -1,6 +1,10 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Value
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
@@ -8,28 +12,49 @@ from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
-from recipes.models import (Favorite, Ingredient, IngredientInRecipe,
-                            Recipe, ShoppingCart, Tag)
-from .filters import IngredientFilter, RecipeFilter
-from .pagination import LimitPagination
+from foodgram.metrics import MetricsViewMixin
+from recipes.cache import get_cache_version, is_cache_shared
+from recipes.constants import EXPORT_CHUNK_SIZE, RESPONSE_CACHE_TIMEOUT
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingCartItem, Tag)
+from recipes.units import base_amount, base_unit, to_readable_unit
+from .decorators import cached_response
+from .exporters import SHOPPING_LIST_EXPORTERS
+from .filters import RecipeFilter, RecipeOrderingFilter
+from .pagination import (ApproximateCountPagination, CursorPaginationMixin,
+                         RecipeCursorPagination)
 from .permissions import IsAdminOrAuthor
 from .serializers import (FavoriteSerializer, IngredientSerializer,
                           RecipeCreateSerializer, RecipeReceiveSerializer,
                           ShoppingCartSerializer, TagSerializer)
+from users.models import Subscription, User
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(MetricsViewMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для ингредиентов."""
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     permission_classes = (AllowAny,)
-    filter_backends = (IngredientFilter,)
-    search_fields = ('^name',)
 
+    @cached_response(Ingredient, query_params=('name',))
+    def list(self, request):
+        """Автодополнение ингредиентов по индексу в памяти, без запросов к БД.
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+        Ингредиенты, название которых начинается с `?name=`, идут первыми.
+        """
+        return Response(
+            ingredient_index.search(request.query_params.get('name', ''))
+        )
+
+    @cached_response(Ingredient)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+class TagViewSet(MetricsViewMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для тегов."""
 
     queryset = Tag.objects.all()
@@ -37,8 +62,18 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (AllowAny,)
     pagination_class = None
 
+    @cached_response(Tag)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_response(Tag)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    MetricsViewMixin, CursorPaginationMixin, viewsets.ModelViewSet
+):
     """Вьюсет для рецептов."""
 
     queryset = Recipe.objects.all().select_related(
@@ -47,16 +82,132 @@ class RecipeViewSet(viewsets.ModelViewSet):
         'tags', 'ingredients_in_recipe__ingredient'
     )
     permission_classes = (IsAdminOrAuthor, IsAuthenticatedOrReadOnly)
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
     filterset_class = RecipeFilter
-    pagination_class = LimitPagination
+    ordering_fields = ('pub_date', 'favorites_count', 'in_carts_count')
+    pagination_class = ApproximateCountPagination
+    cursor_pagination_class = RecipeCursorPagination
     http_method_names = ('get', 'post', 'patch', 'delete')
 
+    def get_queryset(self):
+        """Аннотирует рецепты флагами избранного и списка покупок.
+
+        Изменяющим запросам связанные объекты заранее не нужны: ответ на
+        них загружает теги и ингредиенты уже после изменения.
+        """
+        queryset = super().get_queryset()
+        if self.request.method not in permissions.SAFE_METHODS:
+            queryset = queryset.prefetch_related(None)
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+        )
+
     def get_serializer_class(self):
         if self.request.method in permissions.SAFE_METHODS:
             return RecipeReceiveSerializer
         return RecipeCreateSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        """Отдает рецепт из кеша, накладывая флаги текущего пользователя.
+
+        В кеше хранится не зависящая от пользователя часть ответа. Ключ
+        включает версии рецепта, тегов и ингредиентов, а версия автора
+        сверяется при чтении, поэтому изменение любой из этих записей
+        делает закешированный ответ недействительным. Версии сбрасываются
+        во всех процессах, только если кеш общий: с кешем в памяти
+        процесса рецепт не кешируется.
+        """
+        data = self.get_cached_recipe(kwargs[self.lookup_field])
+        if data is None:
+            data = self.cache_recipe(self.get_object())
+        return Response(data)
+
+    def get_cached_recipe(self, pk):
+        """Закешированный рецепт с флагами пользователя или None."""
+        pk = str(pk)
+        if not pk.isdigit():
+            raise Http404
+        if not is_cache_shared():
+            self.recipe_cache_key = None
+            return None
+        self.recipe_cache_key = (
+            f'recipe:{pk}:{get_cache_version(Recipe, pk)}:'
+            f'{get_cache_version(Tag)}:{get_cache_version(Ingredient)}:'
+            f'{self.request.get_host()}'
+        )
+        cached = cache.get(self.recipe_cache_key)
+        if cached is not None:
+            author_id, author_version, data = cached
+            if get_cache_version(User, author_id) == author_version:
+                return self.overlay_user_flags(pk, data)
+        return None
+
+    def cache_recipe(self, recipe):
+        """Сериализует рецепт и кеширует его под ключом, прочитанным ранее.
+
+        Ключ вычисляется до загрузки рецепта, поэтому изменение, случившееся
+        в промежутке, не оставит в кеше устаревшие данные под новым ключом.
+        """
+        if self.recipe_cache_key is None:
+            return self.get_serializer(recipe).data
+        author_version = get_cache_version(User, recipe.author_id)
+        data = self.get_serializer(recipe).data
+        cache.set(
+            self.recipe_cache_key,
+            (recipe.author_id, author_version, data),
+            RESPONSE_CACHE_TIMEOUT,
+        )
+        return data
+
+    def overlay_user_flags(self, pk, data):
+        """Подставляет в закешированный рецепт флаги текущего пользователя.
+
+        Для анонимного пользователя флаги ложны, для остальных все три
+        вычисляются одним запросом.
+        """
+        user = self.request.user
+        flags = dict.fromkeys(
+            ('is_favorited', 'is_in_shopping_cart', 'is_subscribed'), False
+        )
+        if user.is_authenticated:
+            flags = Recipe.objects.filter(pk=pk).values(
+                is_favorited=Exists(
+                    Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+                ),
+                is_in_shopping_cart=Exists(
+                    ShoppingCart.objects.filter(
+                        user=user, recipe=OuterRef('pk')
+                    )
+                ),
+                is_subscribed=Exists(
+                    Subscription.objects.filter(
+                        user=user, author=OuterRef('author')
+                    )
+                ),
+            ).first()
+            if flags is None:
+                raise Http404
+        return {
+            **data,
+            'is_favorited': flags['is_favorited'],
+            'is_in_shopping_cart': flags['is_in_shopping_cart'],
+            'author': {
+                **data['author'],
+                'is_subscribed': flags['is_subscribed'],
+            },
+        }
+
     @action(
         methods=('GET',),
         detail=True,
@@ -99,30 +250,46 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(
         methods=('GET',),
         permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_LIST_EXPORTERS,
         detail=False
     )
+    @method_decorator(gzip_page)
     def download_shopping_cart(self, request):
-        """Загрузка списка покупок файлом."""
-        user = request.user
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__shoppingcarts__user=user
+        """Загрузка списка покупок файлом.
+
+        Формат выбирается по заголовку `Accept` или параметру `?format=`,
+        строки читаются серверным курсором и сразу отдаются клиенту.
+        Итог каждого ингредиента переводится в наиболее крупную единицу
+        (г в кг, мл в литры). Название ингредиента уникально, поэтому
+        одна строка списка - один ингредиент: ингредиенты с одинаковым
+        названием в разных единицах в справочнике быть не может, и строки
+        разных ингредиентов не складываются.
+        """
+        ingredients = ShoppingCartItem.objects.filter(
+            user=request.user
         ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
+            name=F('ingredient__name'),
+            measurement_unit=base_unit('ingredient__measurement_unit'),
         ).annotate(
-            total_amount=Sum('amount')
-        ).order_by('ingredient__name')
-
-        shopping_list = "Shopping List:\n\n"
-        for item in ingredients:
-            shopping_list += (
-                f"{item['ingredient__name']}: "
-                f"{item['total_amount']} "
-                f"{item['ingredient__measurement_unit']}\n"
+            total_amount=base_amount(
+                'total_amount', 'ingredient__measurement_unit'
             )
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        response[
-            'Content-Disposition'
-        ] = 'attachment; filename="shopping_list.txt"'
+        ).order_by('name')
+
+        exporter = request.accepted_renderer
+        response = StreamingHttpResponse(
+            exporter.stream(map(
+                to_readable_unit,
+                ingredients.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+            )),
+            content_type=(
+                f'{exporter.media_type}; charset={exporter.charset}'
+                if exporter.charset else exporter.media_type
+            ),
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{exporter.format}"'
+        )
         return response
 
     def add_recipe(self, request, pk, serializer_class):
@@ -143,14 +310,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_recipe(self, request, pk, model):
-        """Удаление рецепта из избранного или списка покупок."""
-        user = request.user
+        """Удаление рецепта из избранного или списка покупок.
+
+        Запись блокируется перед удалением: при одновременных запросах
+        строку удаляет один из них, и сигналы уменьшают счетчик и итоги
+        списка покупок один раз.
+        """
         recipe = get_object_or_404(Recipe, pk=pk)
-        recipe_in_cart = user.shoppingcarts.filter(recipe=recipe)
-        if model == Favorite:
-            recipe_in_cart = user.favorites.filter(recipe=recipe)
-        if recipe_in_cart.exists():
-            recipe_in_cart.delete()
+        with transaction.atomic():
+            entry = model.objects.select_for_update().filter(
+                user=request.user, recipe=recipe
+            ).first()
+            deleted = entry.delete()[0] if entry is not None else 0
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         return Response(
@@ -0,0 +1,347 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+# Поле замера, имя метрики и ее описание
+METRICS = (
+    (
+        'duration',
+        'foodgram_request_duration_seconds',
+        'Время обработки запроса.',
+    ),
+    (
+        'db_time',
+        'foodgram_db_duration_seconds',
+        'Время выполнения SQL-запросов.',
+    ),
+    (
+        'view_time',
+        'foodgram_view_duration_seconds',
+        'Время работы представления без учета SQL, включая сериализацию.',
+    ),
+    (
+        'render_time',
+        'foodgram_render_duration_seconds',
+        'Время рендеринга ответа без учета SQL.',
+    ),
+    (
+        'queries',
+        'foodgram_db_queries',
+        'Кол-во SQL-запросов.',
+    ),
+    (
+        'response_bytes',
+        'foodgram_response_size_bytes',
+        'Размер тела ответа.',
+    ),
+)
+
+
+# Замер обрабатываемого запроса, наследуется потоками из sync_to_async
+_current_stats = ContextVar('query_stats', default=None)
+
+
+class QueryStats:
+    """Кол-во SQL-запросов и время в БД одного HTTP-запроса.
+
+    `db_time` - суммарное время запросов. Асинхронные представления
+    выполняют запросы параллельно, и сумма может превышать время обработки,
+    поэтому отдельно учитывается время, когда выполнялся хотя бы один
+    запрос: его вычитают из замеров участков обработки.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.timings = defaultdict(float)
+        self._active = 0
+        self._busy_time = 0.0
+        self._busy_since = None
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        with self._lock:
+            if not self._active:
+                self._busy_since = started
+            self._active += 1
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self.queries += 1
+                self.db_time += finished - started
+                self._active -= 1
+                if not self._active:
+                    self._busy_time += finished - self._busy_since
+
+    def busy_time(self, now):
+        """Время до момента `now`, когда выполнялся хотя бы один запрос."""
+        with self._lock:
+            if self._active:
+                return self._busy_time + now - self._busy_since
+            return self._busy_time
+
+    @contextmanager
+    def capture(self):
+        """Считает запросы текущего контекста, в том числе из пула потоков."""
+        for connection in connections.all():
+            install_query_recorder(connection=connection)
+        token = _current_stats.set(self)
+        try:
+            yield self
+        finally:
+            _current_stats.reset(token)
+
+
+class Timer:
+    """Замер участка обработки текущего запроса без учета времени SQL."""
+
+    def __init__(self, field):
+        self.field = field
+        self.stats = _current_stats.get()
+        self.started = time.perf_counter()
+        if self.stats is not None:
+            self.busy = self.stats.busy_time(self.started)
+
+    def stop(self):
+        if self.stats is None:
+            return
+        finished = time.perf_counter()
+        busy = self.stats.busy_time(finished) - self.busy
+        self.stats.timings[self.field] += finished - self.started - busy
+        self.stats = None
+
+
+class MetricsViewMixin:
+    """Замеряет работу представления DRF и рендеринг его ответа.
+
+    Работа представления, включая `serializer.data`, замеряется от конца
+    проверок доступа до `finalize_response`, рендеринг - от
+    `finalize_response` до его завершения. Асинхронные представления
+    проходят те же этапы, поэтому замеряются так же.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.view_timer = Timer('view_time')
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        view_timer = getattr(self, 'view_timer', None)
+        if view_timer is not None:
+            view_timer.stop()
+        if hasattr(response, 'add_post_render_callback'):
+            render_timer = Timer('render_time')
+            response.add_post_render_callback(
+                lambda response: render_timer.stop()
+            )
+        return response
+
+
+def record_query(execute, sql, params, many, context):
+    """Обертка выполнения SQL, передающая запрос в текущий замер."""
+    stats = _current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection, **kwargs):
+    """Ставит обертку на соединение с БД, в том числе созданное в потоке.
+
+    Асинхронные представления выполняют ORM в пуле потоков, у каждого из
+    которых свое соединение, поэтому замер ищется не по соединению, а
+    через contextvars.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+class MetricsRegistry:
+    """Накопленные замеры запросов в памяти процесса.
+
+    Каждый процесс сервера собирает собственные значения, поэтому при
+    нескольких воркерах Prometheus должен опрашивать их по отдельности
+    либо суммировать счетчики.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)
+        self._sums = defaultdict(float)
+        self._exceeded = defaultdict(int)
+
+    def observe(self, labels, values, exceeded=()):
+        with self._lock:
+            self._requests[labels] += 1
+            for name, value in values.items():
+                self._sums[labels, name] += value
+            for name in exceeded:
+                self._exceeded[labels, name] += 1
+
+    def render(self):
+        """Возвращает замеры в текстовом формате Prometheus."""
+        with self._lock:
+            requests = dict(self._requests)
+            sums = dict(self._sums)
+            exceeded = dict(self._exceeded)
+
+        lines = [
+            '# HELP foodgram_requests_total Кол-во обработанных запросов.',
+            '# TYPE foodgram_requests_total counter',
+        ]
+        lines += (
+            f'foodgram_requests_total{{{_labels(labels)}}} {count}'
+            for labels, count in sorted(requests.items())
+        )
+        for field, metric, description in METRICS:
+            lines += (
+                f'# HELP {metric} {description}',
+                f'# TYPE {metric} summary',
+            )
+            for labels, count in sorted(requests.items()):
+                lines += (
+                    f'{metric}_count{{{_labels(labels)}}} {count}',
+                    f'{metric}_sum{{{_labels(labels)}}} '
+                    f'{sums.get((labels, field), 0):g}',
+                )
+        lines += (
+            '# HELP foodgram_budget_exceeded_total '
+            'Кол-во запросов, превысивших бюджет.',
+            '# TYPE foodgram_budget_exceeded_total counter',
+        )
+        lines += (
+            f'foodgram_budget_exceeded_total'
+            f'{{{_labels(labels)},budget="{field}"}} {count}'
+            for (labels, field), count in sorted(exceeded.items())
+        )
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    endpoint, method = labels
+    return f'endpoint="{endpoint}",method="{method}"'
+
+
+registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    """Замеряет кол-во SQL-запросов, время и размер ответа по эндпоинтам.
+
+    Эндпоинт определяется по имени маршрута (`recipes-list`,
+    `users-subscriptions`). Если замер превышает бюджет из
+    `settings.METRICS_BUDGETS` для `'<метод> <эндпоинт>'` или просто
+    `'<эндпоинт>'`, в лог пишется предупреждение.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Как в MiddlewareMixin: обработчик ASGI вызовет middleware
+            # как корутину, без перехода в поток
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        stats = QueryStats()
+        started = time.perf_counter()
+        with stats.capture():
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, request, stats, started
+            )
+        else:
+            self.record(request, stats, started, len(response.content))
+        return response
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        started = time.perf_counter()
+        with stats.capture():
+            response = await self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, request, stats, started
+            )
+        else:
+            self.record(request, stats, started, len(response.content))
+        return response
+
+    def stream(self, content, request, stats, started):
+        """Досчитывает замеры по мере отдачи потокового ответа."""
+        size = 0
+        try:
+            with stats.capture():
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self.record(request, stats, started, size)
+
+    def record(self, request, stats, started, size):
+        match = request.resolver_match
+        endpoint = match.url_name if match else None
+        if endpoint == 'metrics':
+            return
+        duration = time.perf_counter() - started
+        values = {
+            'duration': duration,
+            'db_time': stats.db_time,
+            'view_time': stats.timings['view_time'],
+            'render_time': stats.timings['render_time'],
+            'queries': stats.queries,
+            'response_bytes': size,
+        }
+        endpoint = endpoint or 'unresolved'
+        budget = settings.METRICS_BUDGETS.get(
+            f'{request.method} {endpoint}',
+            settings.METRICS_BUDGETS.get(endpoint, {}),
+        )
+        exceeded = [
+            name for name, limit in budget.items() if values[name] > limit
+        ]
+        if exceeded:
+            logger.warning(
+                '%s %s exceeded budget: %s',
+                request.method,
+                endpoint,
+                ', '.join(
+                    f'{name}={values[name]:g} > {budget[name]:g}'
+                    for name in exceeded
+                ),
+            )
+        registry.observe((endpoint, request.method), values, exceeded)
+
+
+def metrics(request):
+    """Отдает накопленные замеры, только для доверенных адресов."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
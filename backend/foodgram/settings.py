@@ -21,6 +21,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -31,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -67,7 +69,10 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'foodgram_user'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'foodgram_password'),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # Постоянные соединения: иначе асинхронные представления открывали
+        # бы новое соединение на каждый вызов в пуле потоков
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
     }
 }
 
@@ -80,6 +85,21 @@ DATABASES = {
 }"""
 
 
+# Версии кеша и закешированные ответы должны быть общими для всех процессов
+# (воркеров gunicorn и uvicorn), поэтому в docker-compose используется Redis:
+# CACHE_BACKEND=django_redis.cache.RedisCache, CACHE_LOCATION=redis://...
+# С кешем в памяти процесса ответы живут не дольше
+# LOCAL_RESPONSE_CACHE_TIMEOUT, а детальные ответы рецептов не кешируются.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -110,6 +130,24 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
+
+# Кол-во потоков для фоновой обработки изображений
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+# Ограничения на загружаемые в base64 изображения
+BASE64_IMAGE_MAX_BYTES = int(
+    os.getenv('BASE64_IMAGE_MAX_BYTES', 5 * 1024 * 1024)
+)
+BASE64_IMAGE_MAX_PIXELS = int(
+    os.getenv('BASE64_IMAGE_MAX_PIXELS', 25_000_000)
+)
+
+# TrueType-шрифт с кириллицей для выгрузки списка покупок в PDF
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -127,6 +165,43 @@ REST_FRAMEWORK = {
 
 }
 
+# Начиная с этой оценки кол-ва строк пагинация не выполняет точный COUNT(*)
+PAGINATION_APPROXIMATE_COUNT_THRESHOLD = int(
+    os.getenv('PAGINATION_APPROXIMATE_COUNT_THRESHOLD', 10000)
+)
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 30)
+)
+
+# Служебные команды, которые run_periodic_tasks запускает по расписанию:
+# имя команды -> интервал между запусками в секундах
+PERIODIC_COMMANDS = {
+    'reconcile_counters': int(
+        os.getenv('RECONCILE_COUNTERS_INTERVAL', 6 * 60 * 60)
+    ),
+    'gc_media': int(os.getenv('GC_MEDIA_INTERVAL', 24 * 60 * 60)),
+}
+
+# Адреса, с которых доступен эндпоинт /metrics
+METRICS_ALLOWED_IPS = os.getenv(
+    'METRICS_ALLOWED_IPS', '127.0.0.1,::1'
+).split(',')
+
+# Бюджеты эндпоинтов: при превышении в лог пишется предупреждение.
+# Ключ - '<метод> <имя маршрута>' или просто имя маршрута.
+# Время в секундах, размер ответа в байтах.
+METRICS_BUDGETS = {
+    'GET recipes-list': {'queries': 10, 'duration': 0.5},
+    'POST recipes-list': {'queries': 16, 'duration': 1},
+    'GET recipes-detail': {'queries': 8, 'duration': 0.3},
+    'PATCH recipes-detail': {'queries': 20, 'duration': 1},
+    'recipes-download-shopping-cart': {'queries': 4, 'duration': 2},
+    'users-list': {'queries': 6, 'duration': 0.3},
+    'users-subscriptions': {'queries': 8, 'duration': 0.5},
+    'ingredients-list': {'queries': 2, 'duration': 0.1},
+    'tags-list': {'queries': 2, 'duration': 0.1},
+}
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
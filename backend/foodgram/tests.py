@@ -0,0 +1,54 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from foodgram.metrics import QueryStats, Timer, registry
+
+
+def slow_query(sql, params, many, context):
+    time.sleep(0.05)
+
+
+class QueryStatsTests(SimpleTestCase):
+    """Замеры участков обработки при параллельных запросах к БД."""
+
+    def test_parallel_queries_are_not_subtracted_twice(self):
+        stats = QueryStats()
+        with stats.capture():
+            timer = Timer('view_time')
+            threads = [
+                threading.Thread(
+                    target=stats, args=(slow_query, '', (), False, {})
+                )
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            timer.stop()
+        self.assertEqual(stats.queries, 4)
+        # Сумма времени запросов больше времени, когда шел хотя бы один
+        self.assertGreater(stats.db_time, stats.busy_time(time.perf_counter()))
+        self.assertGreaterEqual(stats.timings['view_time'], 0)
+
+
+class MetricsMiddlewareTests(APITestCase):
+    """Замеры работы представления и рендеринга ответа."""
+
+    def test_view_and_render_time(self):
+        with mock.patch.object(registry, 'observe') as observe:
+            response = self.client.get(reverse('tags-list'))
+        self.assertEqual(response.status_code, 200)
+        (endpoint, method), values, _ = observe.call_args[0]
+        self.assertEqual((endpoint, method), ('tags-list', 'GET'))
+        self.assertGreater(values['view_time'], 0)
+        self.assertGreater(values['render_time'], 0)
+        self.assertLessEqual(
+            values['view_time'] + values['render_time'] + values['db_time'],
+            values['duration'],
+        )
@@ -0,0 +1,37 @@
+import logging
+
+from django.core.cache import cache
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up():
+    """Заполняет кеши процесса до первого запроса.
+
+    Компилирует маршруты, строит индекс ингредиентов и кеширует список
+    тегов, иначе эту работу выполнил бы первый запрос к каждому воркеру.
+    При `preload_app` вызывается один раз в главном процессе gunicorn,
+    и воркеры получают готовые кеши копированием при записи.
+    """
+    from api.views import TagViewSet
+    from recipes.ingredient_index import ingredient_index
+
+    get_resolver().reverse_dict
+    ingredient_index.search()
+    TagViewSet.as_view({'get': 'list'})(RequestFactory().get('/api/tags/'))
+    logger.info('Process caches warmed up')
+
+
+def warm_up_connections():
+    """Открывает соединения процесса с БД и кешем до первого запроса.
+
+    Соединения нельзя унаследовать от главного процесса, поэтому каждый
+    воркер открывает их сам.
+    """
+    for connection in connections.all():
+        connection.ensure_connection()
+    cache.get('warm-up')
+    logger.info('Process connections warmed up')
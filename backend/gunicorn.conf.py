@@ -0,0 +1,88 @@
+"""Настройки gunicorn.
+
+Кол-во воркеров и потоков задается переменными окружения, по умолчанию
+оно рассчитывается по кол-ву процессоров. При `GUNICORN_THREADS` больше 1
+gunicorn использует воркеры `gthread`. Приложение загружается в главном
+процессе до запуска воркеров, поэтому код и данные Django разделяются
+между ними копированием при записи.
+"""
+import multiprocessing
+import os
+
+
+def env_bool(name, default):
+    return os.getenv(name, str(default)).lower() in ('1', 'true', 'yes')
+
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(
+    os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1)
+)
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+preload_app = env_bool('GUNICORN_PRELOAD', True)
+
+# Зависший воркер перезапускается, корректное завершение ограничено
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Воркеры перезапускаются после стольких запросов, чтобы не копить память;
+# разброс не дает им перезапуститься одновременно
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(
+    os.getenv('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10)
+)
+
+# Файлы контроля воркеров в памяти: в Docker /tmp может быть на диске
+worker_tmp_dir = os.getenv('GUNICORN_WORKER_TMP_DIR', '/dev/shm')
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def pre_fork(server, worker):
+    """Закрывает соединения с БД главного процесса перед запуском воркера.
+
+    Иначе воркеры унаследовали бы один сокет соединения на всех.
+    """
+    if preload_app:
+        from django.db import connections
+
+        connections.close_all()
+
+
+def post_fork(server, worker):
+    """Закрывает соединения с БД, унаследованные от главного процесса."""
+    if preload_app:
+        from django.db import connections
+
+        connections.close_all()
+
+
+def when_ready(server):
+    """Прогревает кеши процесса в главном процессе до запуска воркеров.
+
+    Индекс ингредиентов и маршруты строятся один раз, воркеры получают их
+    копированием при записи. Без `preload_app` приложение в главном
+    процессе не загружено, и кеши прогревает каждый воркер.
+    """
+    if preload_app:
+        from foodgram.warmup import warm_up
+
+        try:
+            warm_up()
+        except Exception:
+            server.log.exception('Failed to warm up process caches')
+
+
+def post_worker_init(worker):
+    """Открывает соединения воркера с БД и кешем."""
+    from foodgram.warmup import warm_up, warm_up_connections
+
+    try:
+        if not preload_app:
+            warm_up()
+        warm_up_connections()
+    except Exception:
+        worker.log.exception('Failed to warm up worker')
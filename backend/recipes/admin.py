@@ -58,6 +58,7 @@ class RecipeAdmin(admin.ModelAdmin):
         'author',
         'name',
         'recipe_favorite_additions',
+        'in_carts_count',
         'recipe_ingredients',
         'recipe_tags',
         'recipe_image',
@@ -74,10 +75,13 @@ class RecipeAdmin(admin.ModelAdmin):
     )
     inlines = (IngredientInRecipeInline,)
 
-    @admin.display(description='Добавлений в избранное')
+    @admin.display(
+        description='Добавлений в избранное',
+        ordering='favorites_count',
+    )
     def recipe_favorite_additions(self, recipe):
-        """Считает кол-во добавлений рецепта в избранное."""
-        return recipe.favorites.all().count()
+        """Возвращает кол-во добавлений рецепта в избранное."""
+        return recipe.favorites_count
 
     @admin.display(description='Ингредиенты')
     def recipe_ingredients(self, recipe):
@@ -0,0 +1,56 @@
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from .constants import LOCAL_RESPONSE_CACHE_TIMEOUT
+
+
+def _version_key(model, pk=None):
+    key = f'version:{model._meta.label_lower}'
+    return key if pk is None else f'{key}:{pk}'
+
+
+def get_cache_version(model, pk=None):
+    """Возвращает текущую версию закешированных данных модели.
+
+    Если передан `pk`, версия относится к одному объекту модели.
+    Начальная версия берется из текущего времени, чтобы после вытеснения
+    ключа из кеша версия не совпала ни с одной из прежних.
+    """
+    key = _version_key(model, pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(model, pk=None):
+    """Делает недействительными закешированные данные модели или объекта."""
+    key = _version_key(model, pk)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def is_cache_shared():
+    """Общий ли кеш у всех процессов сервера.
+
+    Локальный кеш (`LocMemCache`) у каждого процесса свой: сброс версии в
+    одном процессе не виден ни другим воркерам gunicorn, ни uvicorn.
+    """
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def get_response_timeout(timeout):
+    """Время жизни закешированного ответа с учетом типа кеша.
+
+    При локальном кеше изменения из других процессов доходят до ответа
+    только по истечении его срока, поэтому он не превышает
+    `LOCAL_RESPONSE_CACHE_TIMEOUT`.
+    """
+    if is_cache_shared():
+        return timeout
+    return min(timeout, LOCAL_RESPONSE_CACHE_TIMEOUT)
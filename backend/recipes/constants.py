@@ -31,6 +31,62 @@ EXTRA = 0
 # Минимальное количество строк:
 MIN_NUM = 1
 
+# Размер пачки строк при выгрузке списка покупок:
+EXPORT_CHUNK_SIZE = 2000
+
+# Конфигурация полнотекстового поиска:
+SEARCH_CONFIG = 'russian'
+
+# Время жизни индекса ингредиентов в памяти процесса, в секундах:
+INGREDIENT_INDEX_TTL = 300
+
+# Время жизни закешированных ответов для справочников, в секундах:
+RESPONSE_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Время жизни закешированных ответов при кеше в памяти процесса, в секундах
+# (совпадает с временем жизни индекса ингредиентов):
+LOCAL_RESPONSE_CACHE_TIMEOUT = INGREDIENT_INDEX_TTL
+
+# Директория для производных изображений:
+DERIVATIVES_DIR = 'derivatives'
+
+# Варианты производных изображений и их ширина в пикселях:
+IMAGE_RENDITIONS = {
+    'card': (320, 640),
+    'detail': (960, 1280),
+    'avatar': (96, 192),
+}
+
+# Варианты производных изображений для рецептов и аватаров:
+RECIPE_IMAGE_RENDITIONS = ('card', 'detail')
+RECIPE_CARD_RENDITIONS = ('card',)
+AVATAR_RENDITIONS = ('avatar',)
+
+# Форматы производных изображений: расширение -> формат Pillow
+IMAGE_DERIVATIVE_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+
+# Качество сжатия производных изображений:
+IMAGE_DERIVATIVE_QUALITY = 80
+
+# Кол-во перечней производных изображений в кеше процесса:
+DERIVATIVE_MANIFEST_CACHE_SIZE = 10000
+
+# Допустимые типы загружаемых изображений: MIME-тип -> расширение
+ALLOWED_IMAGE_TYPES = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/jpg': 'jpg',
+}
+
+# Размер части base64-строки при декодировании (кратен 4):
+BASE64_CHUNK_SIZE = 64 * 1024
+
+# Объем декодированного изображения, хранимый в памяти до записи на диск:
+BASE64_SPOOL_MAX_MEMORY = 1024 * 1024
+
 # Единицы измерения ингредиентов
 GRAMS = 'г'
 KILOGRAMS = 'кг'
@@ -52,3 +108,13 @@ MEASUREMENT_UNIT_CHOICES = (
     (DROP, DROP),
     (PIECES, PIECES),
 )
+
+# Приведение единиц измерения к базовой: единица -> (базовая, коэффициент)
+UNIT_CONVERSIONS = {
+    unit: (unit, 1) for unit, _ in MEASUREMENT_UNIT_CHOICES
+}
+UNIT_CONVERSIONS.update({
+    KILOGRAMS: (GRAMS, 1000),
+    LITERS: (MILLILITERS, 1000),
+    SPOONFULLS: (TEASPOONS, 3),
+})
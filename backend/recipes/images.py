@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .constants import (DERIVATIVE_MANIFEST_CACHE_SIZE, DERIVATIVES_DIR,
+                        IMAGE_DERIVATIVE_FORMATS, IMAGE_DERIVATIVE_QUALITY,
+                        IMAGE_RENDITIONS)
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS,
+    thread_name_prefix='image-derivatives',
+)
+
+
+def derivative_name(name, rendition, width, extension):
+    """Имя файла производного изображения для исходного файла `name`."""
+    stem = os.path.splitext(name)[0]
+    return f'{DERIVATIVES_DIR}/{stem}-{rendition}-{width}.{extension}'
+
+
+def manifest_name(name):
+    """Имя файла с перечнем производных изображений файла `name`."""
+    stem = os.path.splitext(name)[0]
+    return f'{DERIVATIVES_DIR}/{stem}.json'
+
+
+def read_manifest(name):
+    """Возвращает перечень готовых производных изображений файла `name`.
+
+    Перечень имеет вид `{вариант: [[ширина варианта, ширина файла], ...]}`
+    и пуст, если производные еще не создавались.
+    """
+    try:
+        with default_storage.open(manifest_name(name)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+@lru_cache(maxsize=DERIVATIVE_MANIFEST_CACHE_SIZE)
+def cached_manifest(name, renditions):
+    """Перечень производных, в котором есть все варианты `renditions`.
+
+    Имена файлов совпадают с хешем содержимого, а перечень только
+    дополняется, поэтому он кешируется в памяти процесса. Неполный
+    перечень не кешируется: вызов завершается `LookupError`.
+    """
+    manifest = read_manifest(name)
+    if not all(rendition in manifest for rendition in renditions):
+        raise LookupError(name)
+    return manifest
+
+
+def _open_rgb(name):
+    with default_storage.open(name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def generate_derivatives(name, renditions):
+    """Создает уменьшенные копии изображения без метаданных.
+
+    Изображение не увеличивается, поэтому ширины, дающие копию того же
+    размера, что и предыдущая, пропускаются. Фактические ширины копий
+    записываются в перечень производных; он сохраняется последним и
+    служит признаком их готовности. Варианты, уже перечисленные в нем, не
+    пересоздаются: при хранении файлов по хешу содержимого одинаковые
+    изображения дают одинаковые имена.
+
+    Возвращает перечень производных или None, если создать их не удалось.
+    """
+    try:
+        manifest = read_manifest(name)
+        missing = [
+            rendition for rendition in renditions
+            if rendition not in manifest
+        ]
+        if not missing:
+            return manifest
+        image = _open_rgb(name)
+        for rendition in missing:
+            widths = []
+            for width in IMAGE_RENDITIONS[rendition]:
+                resized = image.copy()
+                resized.thumbnail((width, width * 4), Image.LANCZOS)
+                if widths and widths[-1][1] == resized.width:
+                    continue
+                for extension, format in IMAGE_DERIVATIVE_FORMATS.items():
+                    buffer = BytesIO()
+                    resized.save(
+                        buffer,
+                        format,
+                        quality=IMAGE_DERIVATIVE_QUALITY,
+                        optimize=True,
+                    )
+                    target = derivative_name(
+                        name, rendition, width, extension
+                    )
+                    default_storage.delete(target)
+                    default_storage.save(
+                        target, ContentFile(buffer.getvalue())
+                    )
+                widths.append([width, resized.width])
+            manifest[rendition] = widths
+        default_storage.delete(manifest_name(name))
+        default_storage.save(
+            manifest_name(name), ContentFile(json.dumps(manifest).encode())
+        )
+        return manifest
+    except Exception:
+        logger.exception('Failed to generate derivatives for %s', name)
+        return None
+
+
+def schedule_derivatives(field_file, renditions):
+    """Ставит создание производных изображений в фоновый пул.
+
+    Задача запускается после фиксации транзакции, чтобы запрос не ждал
+    обработки изображения.
+    """
+    if not field_file:
+        return
+    name = field_file.name
+    transaction.on_commit(
+        lambda: executor.submit(generate_derivatives, name, renditions)
+    )
+
+
+def _srcset(name, rendition, widths, extension, build_url):
+    return ', '.join(
+        '{} {}w'.format(
+            build_url(default_storage.url(
+                derivative_name(name, rendition, width, extension)
+            )),
+            actual_width,
+        )
+        for width, actual_width in widths
+    )
+
+
+def derivative_srcsets(field_file, renditions, build_url):
+    """Возвращает `srcset` производных изображений по вариантам и форматам.
+
+    Пока производные не созданы, возвращает None, и клиент использует
+    исходное изображение.
+    """
+    if not field_file:
+        return None
+    try:
+        manifest = cached_manifest(field_file.name, tuple(renditions))
+    except LookupError:
+        return None
+    return {
+        rendition: {
+            extension: _srcset(
+                field_file.name,
+                rendition,
+                manifest[rendition],
+                extension,
+                build_url,
+            )
+            for extension in IMAGE_DERIVATIVE_FORMATS
+        }
+        for rendition in renditions
+    }
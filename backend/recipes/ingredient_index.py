@@ -0,0 +1,98 @@
+import bisect
+import itertools
+import threading
+import time
+
+from .cache import get_cache_version
+from .constants import INGREDIENT_INDEX_TTL
+from .models import Ingredient
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов в памяти процесса.
+
+    Хранит отсортированный по названию массив ингредиентов и находит
+    совпадения по префиксу бинарным поиском, а по вхождению - поиском
+    подстроки в склеенных названиях, не обращаясь к БД. Индекс
+    строится при первом обращении и сбрасывается сигналами модели
+    `Ingredient`. Изменения из других процессов (например, `import_data`)
+    подхватываются по версии данных в общем кеше, а при локальном кеше -
+    по истечении `INGREDIENT_INDEX_TTL` секунд.
+    """
+
+    def __init__(self, ttl=INGREDIENT_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = None
+
+    def invalidate(self):
+        """Сбрасывает индекс, он будет перестроен при следующем поиске."""
+        self._data = None
+
+    def _build(self, version):
+        items = sorted(
+            (
+                {'id': id, 'name': name, 'measurement_unit': unit}
+                for id, name, unit in Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit'
+                )
+            ),
+            key=lambda item: item['name'].lower(),
+        )
+        keys = [item['name'].lower() for item in items]
+        # Названия, склеенные через перевод строки, и начало каждого из них
+        text = '\n'.join(keys)
+        offsets = list(itertools.accumulate(
+            (len(key) + 1 for key in keys[:-1]), initial=0
+        ))
+        return version, time.monotonic() + self.ttl, keys, items, text, offsets
+
+    def _is_stale(self, data, version):
+        return (
+            data is None
+            or data[0] != version
+            or data[1] < time.monotonic()
+        )
+
+    def _get_data(self):
+        version = get_cache_version(Ingredient)
+        data = self._data
+        if self._is_stale(data, version):
+            with self._lock:
+                data = self._data
+                if self._is_stale(data, version):
+                    data = self._data = self._build(version)
+        return data
+
+    def search(self, name='', substring=True):
+        """Возвращает ингредиенты, в названии которых есть `name`.
+
+        Сначала идут ингредиенты, название которых начинается с `name`,
+        затем остальные совпадения по вхождению. С `substring=False`
+        возвращаются только совпадения по префиксу.
+        """
+        _, _, keys, items, text, offsets = self._get_data()
+        name = name.lower()
+        if not name:
+            return list(items)
+        start = bisect.bisect_left(keys, name)
+        end = start
+        while end < len(keys) and keys[end].startswith(name):
+            end += 1
+        found = items[start:end]
+        if not substring or '\n' in name:
+            return found
+        # Поиск подстроки идет по всему тексту за один проход на C, а
+        # номер названия по позиции находится бинарным поиском
+        position = text.find(name)
+        while position != -1:
+            index = bisect.bisect_right(offsets, position) - 1
+            if not start <= index < end:
+                found.append(items[index])
+            if index + 1 == len(offsets):
+                break
+            position = text.find(name, offsets[index + 1])
+        return found
+
+
+ingredient_index = IngredientIndex()
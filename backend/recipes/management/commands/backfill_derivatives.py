@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+
+from recipes.constants import AVATAR_RENDITIONS, RECIPE_IMAGE_RENDITIONS
+from recipes.images import generate_derivatives, read_manifest
+from recipes.models import Recipe
+from users.models import User
+
+FIELDS = (
+    (Recipe, 'image', RECIPE_IMAGE_RENDITIONS),
+    (User, 'avatar', AVATAR_RENDITIONS),
+)
+
+
+class Command(BaseCommand):
+    """Создает недостающие производные изображения.
+
+    Нужна для изображений, загруженных до появления производных, и для
+    тех, чья фоновая обработка завершилась ошибкой.
+    """
+
+    help = 'Создает производные копии изображений, у которых их нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать изображения без производных копий',
+        )
+
+    def handle(self, *args, **options):
+        missing = failed = 0
+        for model, field, renditions in FIELDS:
+            names = model._default_manager.filter(
+                **{f'{field}__gt': ''}
+            ).order_by().values_list(field, flat=True).distinct()
+            for name in names.iterator():
+                manifest = read_manifest(name)
+                if all(rendition in manifest for rendition in renditions):
+                    continue
+                missing += 1
+                self.stdout.write(name)
+                if options['dry_run']:
+                    continue
+                if generate_derivatives(name, renditions) is None:
+                    failed += 1
+        self.stdout.write(f'Missing: {missing}, failed: {failed}')
+        if not options['dry_run'] and not failed:
+            self.stdout.write(
+                self.style.SUCCESS('SUCCESSFULLY GENERATED DERIVATIVES')
+            )
@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.db.models.functions import Lower
+
+from recipes.ingredient_index import IngredientIndex
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    """Сравнивает поиск ингредиентов по индексу в памяти и через ORM.
+
+    Замеряются поиск по префиксу и поиск по вхождению, которым отвечает
+    `/api/ingredients/?name=`.
+    """
+
+    help = 'Замеряет скорость автодополнения ингредиентов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Сколько раз повторить набор запросов',
+        )
+
+    def handle(self, *args, **options):
+        names = Ingredient.objects.values_list('name', flat=True)[::50]
+        prefixes = [
+            name[:length].lower()
+            for name in names
+            for length in (1, 2, 3)
+        ]
+        if not prefixes:
+            self.stdout.write(self.style.ERROR('NO INGREDIENTS TO SEARCH'))
+            return
+        lookups = len(prefixes) * options['repeat']
+        index = IngredientIndex()
+        index.search()
+        self.stdout.write(f'Lookups: {lookups}')
+        # Индекс сравнивается с ORM на одинаковых запросах: по префиксу и
+        # по вхождению с совпадениями по префиксу в начале, как в API
+        for title, substring, queryset in (
+            ('Prefix', False, self.prefix_queryset),
+            ('Substring', True, self.substring_queryset),
+        ):
+            index_time = self.measure(
+                lambda prefix: index.search(prefix, substring),
+                prefixes, options['repeat'],
+            )
+            orm_time = self.measure(
+                lambda prefix: list(queryset(prefix)),
+                prefixes, options['repeat'],
+            )
+            self.stdout.write(
+                f'{title}: index {index_time / lookups * 1e6:.1f} us, '
+                f'ORM {orm_time / lookups * 1e6:.1f} us per lookup, '
+                f'speedup x{orm_time / index_time:.1f}'
+            )
+        self.stdout.write(self.style.SUCCESS('BENCHMARK FINISHED'))
+
+    def measure(self, search, prefixes, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for prefix in prefixes:
+                search(prefix)
+        return time.perf_counter() - started
+
+    def prefix_queryset(self, prefix):
+        return Ingredient.objects.filter(
+            name__istartswith=prefix
+        ).order_by(Lower('name')).values('id', 'name', 'measurement_unit')
+
+    def substring_queryset(self, prefix):
+        return Ingredient.objects.filter(
+            name__icontains=prefix
+        ).order_by(
+            ExpressionWrapper(
+                Q(name__istartswith=prefix), output_field=BooleanField()
+            ).desc(),
+            Lower('name'),
+        ).values('id', 'name', 'measurement_unit')
@@ -0,0 +1,92 @@
+import os
+import re
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from recipes.constants import DERIVATIVES_DIR, IMAGE_RENDITIONS
+from recipes.storage import delete_blob, file_fields
+
+# Суффикс производного изображения или перечня производных
+DERIVATIVE_SUFFIX = re.compile(
+    r'(-({})-\d+)?\.\w+$'.format('|'.join(IMAGE_RENDITIONS))
+)
+
+
+def walk(directory):
+    """Рекурсивно перечисляет файлы хранилища в каталоге."""
+    if not default_storage.exists(directory):
+        return
+    directories, files = default_storage.listdir(directory)
+    for name in files:
+        yield os.path.join(directory, name)
+    for name in directories:
+        yield from walk(os.path.join(directory, name))
+
+
+class Command(BaseCommand):
+    """Удаляет файлы, на которые не ссылается ни одна запись в БД."""
+
+    help = 'Удаляет неиспользуемые изображения и их производные копии'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать файлы, которые будут удалены',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help='Не трогать файлы моложе указанного числа секунд',
+        )
+
+    def handle(self, *args, **options):
+        directories = set()
+        referenced = set()
+        for model, field in file_fields():
+            if isinstance(field.upload_to, str):
+                directories.add(field.upload_to.rstrip('/'))
+            referenced.update(
+                model._default_manager.exclude(
+                    **{field.name: ''}
+                ).values_list(field.name, flat=True)
+            )
+        stems = {os.path.splitext(name)[0] for name in referenced}
+        deadline = time.time() - options['min_age']
+
+        def is_stale(name):
+            return (
+                default_storage.get_modified_time(name).timestamp() < deadline
+            )
+
+        orphans = [
+            name
+            for directory in sorted(directories)
+            for name in walk(directory)
+            if name not in referenced and is_stale(name)
+        ]
+        derivatives = [
+            name
+            for name in walk(DERIVATIVES_DIR)
+            if DERIVATIVE_SUFFIX.sub(
+                '', name[len(DERIVATIVES_DIR) + 1:]
+            ) not in stems and is_stale(name)
+        ]
+
+        for name in orphans + derivatives:
+            self.stdout.write(name)
+        self.stdout.write(
+            f'Orphans: {len(orphans)}, derivatives: {len(derivatives)}'
+        )
+        if options['dry_run']:
+            return
+        for name in orphans:
+            delete_blob(name)
+        for name in derivatives:
+            default_storage.delete(name)
+        self.stdout.write(
+            self.style.SUCCESS('SUCCESSFULLY REMOVED UNUSED MEDIA')
+        )
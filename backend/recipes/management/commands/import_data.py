@@ -1,47 +1,148 @@
 # flake8:noqa
+import csv
 import json
 import os
+from functools import partial
+from itertools import islice
+from json.decoder import WHITESPACE
 from pathlib import Path
 
 from django.core.management.base import BaseCommand
+from django.db import connection, transaction
 
+from recipes.cache import bump_cache_version
 from recipes.models import Ingredient, Tag
 
 # Путь до директории с json-файлами
 JSON_PATH = os.path.join(
     Path(__file__).resolve().parent.parent.parent.parent, 'data')
 
-# Словарь соответствий модели и json-файла
-MODEL_FILE_MATCHING = {
-    Tag: 'tags.json',
-    Ingredient: 'ingredients.json',
-}
+# Модель, параметр команды с путем до файла, файл по умолчанию, поля
+# строки файла и поле, по которому строка сопоставляется с записью в БД
+IMPORTS = (
+    (Tag, 'tags', 'tags.json', ('name', 'slug'), 'slug'),
+    (
+        Ingredient,
+        'ingredients',
+        'ingredients.json',
+        ('name', 'measurement_unit'),
+        'name',
+    ),
+)
+
+# Объем текста, читаемого из json-файла за раз
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def iter_json_array(file, chunk_size=JSON_CHUNK_SIZE):
+    """Отдает элементы json-массива по одному, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer, position, expected = '', 0, '['
+    for chunk in iter(partial(file.read, chunk_size), ''):
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            position = WHITESPACE.match(buffer, position).end()
+            if position == len(buffer):
+                break
+            char = buffer[position]
+            if expected == '[':
+                if char != '[':
+                    raise ValueError('JSON array expected')
+                position, expected = position + 1, 'item or ]'
+            elif char == ']' and expected != 'item':
+                return
+            elif expected == ', or ]':
+                if char != ',':
+                    raise ValueError(f'Expected `, or ]`, got `{char}`')
+                position, expected = position + 1, 'item'
+            else:
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # Элемент еще не дочитан целиком
+                    break
+                if end == len(buffer):
+                    break
+                yield item
+                position, expected = end, ', or ]'
+    raise ValueError(f'Unexpected end of file, expected `{expected}`')
+
+
+def iter_csv(file, fields):
+    """Отдает строки csv-файла словарями, пропуская строку заголовков."""
+    for number, row in enumerate(csv.reader(file)):
+        if number == 0 and tuple(row) == fields:
+            continue
+        yield dict(zip(fields, row))
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
 
 
 class Command(BaseCommand):
-    """Пользовательская команда Django для импорта данных из json в БД."""
+    """Пользовательская команда Django для импорта данных из json в БД.
+
+    Файлы читаются потоково и записываются пачками: новые записи
+    добавляются, у найденных обновляются изменившиеся поля, поэтому
+    команду можно безопасно запускать повторно.
+    """
+
+    help = 'Загружает данные из файлов json или csv в БД'
 
-    help = 'Загружает данные из файлов json в БД'
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tags',
+            help='Путь до json- или csv-файла с тегами',
+        )
+        parser.add_argument(
+            '--ingredients',
+            help='Путь до json- или csv-файла с ингредиентами',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Кол-во строк, записываемых одним запросом',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Посчитать изменения и откатить их',
+        )
 
     def handle(self, *args, **kwargs):
-        for model, file_name in MODEL_FILE_MATCHING.items():
-            file_path = os.path.join(JSON_PATH, file_name)
+        for model, option, file_name, fields, key in IMPORTS:
+            file_path = kwargs[option] or os.path.join(JSON_PATH, file_name)
             error_occurred = False
             try:
-                with open(file_path, 'r', encoding='utf-8') as file:
-                    data = json.load(file)
-                    objects_to_create = [model(**item) for item in data]
-
-                    model.objects.bulk_create(
-                        objects_to_create, ignore_conflicts=True
+                with transaction.atomic():
+                    inserted, updated, skipped = self.load(
+                        model, file_path, fields, key, kwargs['batch_size']
                     )
-
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            'SUCCESSFULLY LOADED '
-                            f'`{model.__name__.upper()}` DATA'
-                        )
+                    if kwargs['dry_run']:
+                        transaction.set_rollback(True)
+                self.stdout.write(
+                    f'`{model.__name__.upper()}`: inserted {inserted}, '
+                    f'updated {updated}, skipped {skipped}'
+                )
+                if kwargs['dry_run']:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'DRY RUN OF `{model.__name__.upper()}` DATA, '
+                        'NOTHING SAVED'
+                    ))
+                    continue
+                if inserted or updated:
+                    bump_cache_version(model)
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        'SUCCESSFULLY LOADED '
+                        f'`{model.__name__.upper()}` DATA'
                     )
+                )
             except Exception as error:
                 self.stdout.write(
                     self.style.ERROR(
@@ -56,3 +157,143 @@ class Command(BaseCommand):
                         f'FAILED TO LOAD `{model.__name__.upper()}` DATA'
                     )
                 )
+
+    def load(self, model, file_path, fields, key, batch_size):
+        """Записывает файл пачками, возвращает итоговые счетчики."""
+        upsert = (
+            self.upsert_postgresql if connection.vendor == 'postgresql'
+            else self.upsert_generic
+        )
+        inserted = updated = skipped = 0
+        with open(file_path, 'r', encoding='utf-8', newline='') as file:
+            if file_path.endswith('.csv'):
+                items = iter_csv(file, fields)
+            else:
+                items = iter_json_array(file)
+            for batch in batched(enumerate(items, 1), batch_size):
+                rows = {}
+                for number, item in batch:
+                    values = self.clean(model, fields, item)
+                    if values is None:
+                        self.stdout.write(self.style.WARNING(
+                            f'Skipped invalid row {number}: {item}'
+                        ))
+                        continue
+                    rows[values[key]] = values
+                batch_inserted, batch_updated = upsert(
+                    model, key, self.drop_conflicts(model, key, rows)
+                )
+                inserted += batch_inserted
+                updated += batch_updated
+                skipped += len(batch) - batch_inserted - batch_updated
+        return inserted, updated, skipped
+
+    def clean(self, model, fields, item):
+        """Значения полей строки или None, если строка некорректна."""
+        if not isinstance(item, dict):
+            return None
+        values = {}
+        for name in fields:
+            value = item.get(name)
+            if not isinstance(value, str):
+                return None
+            value = value.strip()
+            max_length = model._meta.get_field(name).max_length
+            if not value or len(value) > max_length:
+                return None
+            values[name] = value
+        return values
+
+    def drop_conflicts(self, model, key, rows):
+        """Убирает строки, уникальные поля которых заняты другими записями.
+
+        Строка сопоставляется с записью только по `key`, поэтому, например,
+        тег с новым slug и названием существующего тега нарушил бы
+        уникальность названия и откатил бы загрузку всего файла. Такие
+        строки, как и повторы уникального значения внутри пачки,
+        пропускаются с предупреждением.
+        """
+        for field in model._meta.fields:
+            if not field.unique or field.primary_key or field.name == key:
+                continue
+            name = field.name
+            owners = dict(model.objects.filter(**{
+                f'{name}__in': [values[name] for values in rows.values()]
+            }).values_list(name, key))
+            for key_value, values in list(rows.items()):
+                owner = owners.setdefault(values[name], key_value)
+                if owner != key_value:
+                    self.stdout.write(self.style.WARNING(
+                        f'Skipped row {values}: {name} `{values[name]}` '
+                        f'is already used by {key} `{owner}`'
+                    ))
+                    del rows[key_value]
+        return rows
+
+    def upsert_postgresql(self, model, key, rows):
+        """Одним запросом добавляет новые строки и обновляет изменившиеся.
+
+        Не изменившиеся строки не обновляются и не возвращаются, а
+        `xmax = 0` отличает добавленные строки от обновленных.
+        """
+        if not rows:
+            return 0, 0
+        quote = connection.ops.quote_name
+        table = quote(model._meta.db_table)
+        fields = list(next(iter(rows.values())))
+        columns = [
+            quote(model._meta.get_field(name).column) for name in fields
+        ]
+        updated_columns = [
+            column for name, column in zip(fields, columns) if name != key
+        ]
+        placeholders = ', '.join(
+            [f"({', '.join(['%s'] * len(fields))})"] * len(rows)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) "
+                f'VALUES {placeholders} '
+                f'ON CONFLICT ({quote(model._meta.get_field(key).column)}) '
+                'DO UPDATE SET '
+                + ', '.join(
+                    f'{column} = EXCLUDED.{column}'
+                    for column in updated_columns
+                )
+                + ' WHERE ('
+                + ', '.join(f'{table}.{column}' for column in updated_columns)
+                + ') IS DISTINCT FROM ('
+                + ', '.join(f'EXCLUDED.{column}' for column in updated_columns)
+                + ') RETURNING xmax = 0',
+                [
+                    value
+                    for values in rows.values() for value in values.values()
+                ],
+            )
+            results = [is_inserted for is_inserted, in cursor.fetchall()]
+        inserted = sum(results)
+        return inserted, len(results) - inserted
+
+    def upsert_generic(self, model, key, rows):
+        """Сравнивает строки с записями в БД и пишет разницу пачками."""
+        existing = model.objects.in_bulk(rows, field_name=key)
+        to_create, to_update = [], []
+        update_fields = set()
+        for key_value, values in rows.items():
+            instance = existing.get(key_value)
+            if instance is None:
+                to_create.append(model(**values))
+                continue
+            changed = [
+                name for name, value in values.items()
+                if getattr(instance, name) != value
+            ]
+            if changed:
+                for name in changed:
+                    setattr(instance, name, values[name])
+                update_fields.update(changed)
+                to_update.append(instance)
+        model.objects.bulk_create(to_create)
+        if to_update:
+            model.objects.bulk_update(to_update, update_fields)
+        return len(to_create), len(to_update)
@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import IngredientInRecipe, ShoppingCartItem
+
+
+class Command(BaseCommand):
+    """Пересчитывает итоги списков покупок по рецептам в корзинах."""
+
+    help = 'Проверяет и перестраивает таблицу итогов списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только проверить расхождения, не исправляя их',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            expected = {
+                (row['recipe__shoppingcarts__user'], row['ingredient']):
+                    row['total_amount']
+                for row in IngredientInRecipe.objects.filter(
+                    recipe__shoppingcarts__isnull=False
+                ).values(
+                    'recipe__shoppingcarts__user', 'ingredient'
+                ).annotate(
+                    total_amount=Sum('amount')
+                ).order_by()
+            }
+            items = {
+                (item.user_id, item.ingredient_id): item
+                for item in ShoppingCartItem.objects.select_for_update()
+            }
+            to_create = [
+                ShoppingCartItem(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total_amount=total_amount,
+                )
+                for (user_id, ingredient_id), total_amount in expected.items()
+                if (user_id, ingredient_id) not in items
+            ]
+            to_update = []
+            to_delete = []
+            for key, item in items.items():
+                if key not in expected:
+                    to_delete.append(item.id)
+                elif item.total_amount != expected[key]:
+                    item.total_amount = expected[key]
+                    to_update.append(item)
+
+            self.stdout.write(
+                f'Missing: {len(to_create)}, '
+                f'wrong: {len(to_update)}, '
+                f'stale: {len(to_delete)}'
+            )
+            if options['verify']:
+                if to_create or to_update or to_delete:
+                    self.stdout.write(
+                        self.style.ERROR('SHOPPING CART ITEMS ARE OUT OF SYNC')
+                    )
+                else:
+                    self.stdout.write(
+                        self.style.SUCCESS('SHOPPING CART ITEMS ARE IN SYNC')
+                    )
+                return
+
+            ShoppingCartItem.objects.bulk_create(to_create)
+            ShoppingCartItem.objects.bulk_update(to_update, ('total_amount',))
+            ShoppingCartItem.objects.filter(id__in=to_delete).delete()
+        self.stdout.write(
+            self.style.SUCCESS('SUCCESSFULLY REBUILT SHOPPING CART ITEMS')
+        )
@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+    (User, 'following_count', Subscription, 'user'),
+)
+
+
+def count_related(related_model, related_field):
+    """Подзапрос с фактическим кол-вом связанных записей."""
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(
+                **{related_field: OuterRef('pk')}
+            ).order_by().values(related_field).annotate(
+                count=Count('pk')
+            ).values('count')
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    """Сверяет денормализованные счетчики с фактическими данными.
+
+    Запускается по расписанию командой `run_periodic_tasks`
+    (`settings.PERIODIC_COMMANDS`).
+    """
+
+    help = 'Проверяет и исправляет счетчики рецептов и пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только проверить расхождения, не исправляя их',
+        )
+
+    def handle(self, *args, **options):
+        drift = 0
+        for model, field, related_model, related_field in COUNTERS:
+            with transaction.atomic():
+                stale = model.objects.annotate(
+                    actual=count_related(related_model, related_field)
+                ).exclude(**{field: F('actual')})
+                count = stale.count()
+                self.stdout.write(
+                    f'{model._meta.label}.{field}: {count} wrong'
+                )
+                drift += count
+                if count and not options['verify']:
+                    model.objects.filter(
+                        pk__in=stale.values('pk')
+                    ).update(**{
+                        field: count_related(related_model, related_field)
+                    })
+
+        if not options['verify']:
+            self.stdout.write(
+                self.style.SUCCESS('SUCCESSFULLY RECONCILED COUNTERS')
+            )
+        elif drift:
+            self.stdout.write(self.style.ERROR('COUNTERS ARE OUT OF SYNC'))
+        else:
+            self.stdout.write(self.style.SUCCESS('COUNTERS ARE IN SYNC'))
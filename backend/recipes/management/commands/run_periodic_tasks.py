@@ -0,0 +1,48 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Запускает служебные команды из `settings.PERIODIC_COMMANDS`.
+
+    Каждая команда выполняется сразу после старта, а затем раз в свой
+    интервал. Ошибка команды пишется в лог и не останавливает остальные.
+    В docker-compose команда работает в отдельном сервисе `maintenance`.
+    """
+
+    help = 'Периодически запускает служебные команды'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить все команды один раз и завершиться',
+        )
+
+    def handle(self, *args, **options):
+        next_run = dict.fromkeys(settings.PERIODIC_COMMANDS, 0.0)
+        while True:
+            for name, interval in settings.PERIODIC_COMMANDS.items():
+                if next_run[name] <= time.monotonic():
+                    next_run[name] = time.monotonic() + interval
+                    self.run(name)
+            if options['once']:
+                return
+            time.sleep(max(min(next_run.values()) - time.monotonic(), 0))
+
+    def run(self, name):
+        self.stdout.write(f'Running {name}')
+        try:
+            call_command(name, stdout=self.stdout)
+        except Exception:
+            logger.exception('Periodic command %s failed', name)
+        finally:
+            # Между запусками соединение простаивает часами
+            connections.close_all()
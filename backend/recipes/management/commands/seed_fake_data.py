@@ -0,0 +1,365 @@
+import multiprocessing
+import os
+import random
+import time
+from io import BytesIO, StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections, models, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from recipes import seeding
+from recipes.constants import RECIPE_IMAGE_RENDITIONS
+from recipes.images import generate_derivatives
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, ShoppingCartItem, Tag)
+from recipes.search import update_search_vector
+from users.models import Subscription, User
+
+# Пароль всех сгенерированных пользователей
+SEED_PASSWORD = 'benchmark-password'
+
+# Таблицы, в которые пишут производители, и поля в порядке значений строк
+TABLES = {
+    'users': (User, (
+        'id', 'password', 'is_superuser', 'username', 'first_name',
+        'last_name', 'email', 'is_staff', 'is_active', 'date_joined',
+        'recipes_count', 'followers_count', 'following_count',
+    )),
+    'recipes': (Recipe, (
+        'id', 'author', 'name', 'image', 'text', 'cooking_time', 'pub_date',
+        'favorites_count', 'in_carts_count',
+    )),
+    'recipe_tags': (Recipe.tags.through, ('recipe', 'tag')),
+    'recipe_ingredients': (IngredientInRecipe, (
+        'recipe', 'ingredient', 'amount',
+    )),
+    'favorites': (Favorite, ('user', 'recipe')),
+    'shopping_carts': (ShoppingCart, ('user', 'recipe')),
+    'subscriptions': (Subscription, ('user', 'author')),
+}
+
+
+def copy_value(value):
+    """Значение в текстовом формате COPY PostgreSQL."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, str):
+        return (
+            value.replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r')
+        )
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+class InlineProducers:
+    """Генерация в текущем процессе вместо пула процессов."""
+
+    imap = staticmethod(map)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class Command(BaseCommand):
+    """Наполняет БД синтетическими данными для нагрузочного тестирования.
+
+    Строки генерируются пулом процессов и записываются в PostgreSQL через
+    `COPY FROM STDIN`, в остальных БД - пачками `INSERT`. Одинаковое зерно
+    дает одинаковые данные при любом кол-ве процессов.
+    """
+
+    help = 'Создает пользователей, рецепты, избранное, корзины и подписки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Зерно генератора, одинаковое зерно дает одинаковые данные',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Кол-во процессов-производителей, 1 - без пула процессов',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Кол-во строк в одном INSERT, если COPY недоступен',
+        )
+        parser.add_argument(
+            '--prefix',
+            default='bench',
+            help='Префикс имен сгенерированных пользователей',
+        )
+        parser.add_argument(
+            '--flush',
+            action='store_true',
+            help='Удалить ранее сгенерированных пользователей с их данными',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['recipes'] < 1:
+            raise CommandError('--users and --recipes must be positive')
+        prefix = options['prefix']
+        self.batch_size = options['batch_size']
+        self.use_copy = connection.vendor == 'postgresql'
+        seeded = User.objects.filter(username__startswith=prefix)
+        if options['flush']:
+            self.flush(seeded)
+        elif seeded.exists():
+            raise CommandError(
+                f'Users with prefix `{prefix}` already exist, use --flush'
+            )
+
+        tag_ids = sorted(Tag.objects.values_list('id', flat=True))
+        ingredient_ids = sorted(
+            Ingredient.objects.values_list('id', flat=True)
+        )
+        if not tag_ids or not ingredient_ids:
+            raise CommandError('Load tags and ingredients with import_data')
+        random.Random(options['seed']).shuffle(ingredient_ids)
+
+        first_user_id = self.next_id(User)
+        first_recipe_id = self.next_id(Recipe)
+        context = {
+            'seed': options['seed'],
+            'prefix': prefix,
+            'users': options['users'],
+            'recipes': options['recipes'],
+            'first_user_id': first_user_id,
+            'first_recipe_id': first_recipe_id,
+            'user_ids': range(
+                first_user_id, first_user_id + options['users']
+            ),
+            'recipe_ids': range(
+                first_recipe_id, first_recipe_id + options['recipes']
+            ),
+            'tag_ids': tag_ids,
+            'ingredient_ids': ingredient_ids,
+            'password': make_password(SEED_PASSWORD),
+            'image': self.save_image(),
+            'now': timezone.now(),
+        }
+        stages = (
+            ('users', seeding.generate_users, options['users']),
+            ('recipes', seeding.generate_recipes, options['recipes']),
+            ('links', seeding.generate_user_links, options['users']),
+        )
+
+        started = time.perf_counter()
+        # Процессы-производители не должны наследовать открытые соединения
+        connections.close_all()
+        with self.producers(options['workers'], context) as pool:
+            with transaction.atomic():
+                for stage, producer, total in stages:
+                    self.write_stage(stage, pool.imap(
+                        producer, range(seeding.chunk_count(total))
+                    ))
+                self.reset_sequences()
+                self.fill_shopping_cart_items(
+                    User.objects.filter(id__gte=first_user_id)
+                )
+        self.analyze_tables()
+        update_search_vector(
+            Recipe.objects.filter(id__gte=first_recipe_id).values('id')
+        )
+        call_command('reconcile_counters', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            'SUCCESSFULLY SEEDED FAKE DATA '
+            f'IN {time.perf_counter() - started:.1f}s'
+        ))
+
+    def flush(self, users):
+        """Удаляет сгенерированных пользователей со всеми их данными.
+
+        Каскадное удаление ORM загружает каждую строку и отправляет на нее
+        сигналы, поэтому строки удаляются запросами DELETE по связям без
+        сигналов. Итоги списков покупок остальных пользователей, у которых
+        в корзине были удаленные рецепты, пересчитываются заново, а
+        счетчики пересчитывает `reconcile_counters` после генерации.
+        """
+        started = time.perf_counter()
+        affected = list(ShoppingCart.objects.filter(
+            recipe__author__in=users
+        ).exclude(user__in=users).values_list('user_id', flat=True).distinct())
+        with transaction.atomic():
+            deleted = self.raw_delete(users)
+            if affected:
+                affected = User.objects.filter(id__in=affected)
+                ShoppingCartItem.objects.filter(
+                    user__in=affected
+                )._raw_delete(connection.alias)
+                self.fill_shopping_cart_items(affected)
+        self.stdout.write(
+            f'Flushed {deleted:,} rows in {time.perf_counter() - started:.1f}s'
+        )
+
+    def raw_delete(self, queryset):
+        """Удаляет строки выборки и ссылающиеся на них строки без сигналов.
+
+        Возвращает кол-во удаленных строк.
+        """
+        model = queryset.model
+        deleted = 0
+        for relation in model._meta.related_objects:
+            related = relation.related_model._base_manager
+            if relation.many_to_many:
+                through = relation.through._base_manager
+                deleted += through.filter(**{
+                    f'{relation.field.m2m_reverse_field_name()}__in': queryset
+                })._raw_delete(connection.alias)
+            elif relation.on_delete is models.CASCADE:
+                deleted += self.raw_delete(related.filter(**{
+                    f'{relation.field.name}__in': queryset
+                }))
+            else:
+                raise CommandError(
+                    f'Cannot flush {model.__name__}: '
+                    f'{relation.related_model.__name__} is not cascaded'
+                )
+        for field in model._meta.many_to_many:
+            deleted += field.remote_field.through._base_manager.filter(**{
+                f'{field.m2m_field_name()}__in': queryset
+            })._raw_delete(connection.alias)
+        return deleted + queryset._raw_delete(connection.alias)
+
+    def next_id(self, model):
+        last_id = model.objects.aggregate(last_id=Max('id'))['last_id']
+        return (last_id or 0) + 1
+
+    def save_image(self):
+        buffer = BytesIO()
+        Image.new('RGB', (640, 480), 'orange').save(buffer, 'JPEG')
+        name = default_storage.save(
+            'recipes/images/seed.jpg', ContentFile(buffer.getvalue())
+        )
+        # Рецепты пишутся в БД напрямую, поэтому производные общего
+        # изображения создаются сразу
+        generate_derivatives(name, RECIPE_IMAGE_RENDITIONS)
+        return name
+
+    def producers(self, workers, context):
+        """Пул процессов-производителей или генерация в текущем процессе."""
+        if workers > 1:
+            return multiprocessing.Pool(
+                workers, seeding.init_worker, (context,)
+            )
+        seeding.init_worker(context)
+        return InlineProducers()
+
+    def write_stage(self, stage, chunks):
+        """Записывает порции по мере готовности и печатает прогресс."""
+        started = time.perf_counter()
+        written = 0
+        for number, rows in enumerate(chunks, 1):
+            for table, table_rows in rows.items():
+                self.write_rows(table, table_rows)
+                written += len(table_rows)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'\r{stage}: {number} chunks, {written:,} rows, '
+                f'{written / elapsed:,.0f} rows/s',
+                ending='',
+            )
+            self.stdout.flush()
+        self.stdout.write('')
+
+    def write_rows(self, table, rows):
+        if not rows:
+            return
+        model, fields = TABLES[table]
+        fields = [model._meta.get_field(field) for field in fields]
+        quote = connection.ops.quote_name
+        table_name = quote(model._meta.db_table)
+        columns = ', '.join(quote(field.column) for field in fields)
+        with connection.cursor() as cursor:
+            if self.use_copy:
+                cursor.copy_expert(
+                    f'COPY {table_name} ({columns}) FROM STDIN',
+                    StringIO(''.join(
+                        '\t'.join(map(copy_value, row)) + '\n'
+                        for row in rows
+                    )),
+                )
+                return
+            adapters = [
+                connection.ops.adapt_datetimefield_value
+                if isinstance(field, models.DateTimeField) else None
+                for field in fields
+            ]
+            if any(adapters):
+                rows = [
+                    [
+                        adapt(value) if adapt else value
+                        for adapt, value in zip(adapters, row)
+                    ]
+                    for row in rows
+                ]
+            placeholders = ', '.join(['%s'] * len(fields))
+            for start in range(0, len(rows), self.batch_size):
+                cursor.executemany(
+                    f'INSERT INTO {table_name} ({columns}) '
+                    f'VALUES ({placeholders})',
+                    rows[start:start + self.batch_size],
+                )
+
+    def reset_sequences(self):
+        """Сдвигает последовательности id после вставки явных id."""
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), (User, Recipe)
+            ):
+                cursor.execute(sql)
+
+    def analyze_tables(self):
+        """Обновляет статистику планировщика по заполненным таблицам.
+
+        Автоанализ PostgreSQL не успевает за массовой вставкой, и без
+        статистики последующие запросы по новым строкам получают планы,
+        рассчитанные на пустые таблицы.
+        """
+        if connection.vendor != 'postgresql':
+            return
+        quote = connection.ops.quote_name
+        tables = [model for model, _ in TABLES.values()] + [ShoppingCartItem]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE ' + ', '.join(
+                quote(model._meta.db_table) for model in tables
+            ))
+
+    def fill_shopping_cart_items(self, users):
+        """Считает итоги списков покупок пользователей из выборки."""
+        quote = connection.ops.quote_name
+        users_sql, params = users.values('id').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(ShoppingCartItem._meta.db_table)} '
+                '(user_id, ingredient_id, total_amount) '
+                'SELECT cart.user_id, item.ingredient_id, SUM(item.amount) '
+                f'FROM {quote(ShoppingCart._meta.db_table)} cart '
+                f'JOIN {quote(IngredientInRecipe._meta.db_table)} item '
+                'ON item.recipe_id = cart.recipe_id '
+                f'WHERE cart.user_id IN ({users_sql}) '
+                'GROUP BY cart.user_id, item.ingredient_id',
+                params,
+            )
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+# Автодополнение ингредиентов обслуживается индексом в памяти процесса,
+# триграммный индекс по названиям ингредиентов не используется
+DROP_INDEX_SQL = 'DROP INDEX IF EXISTS recipes_ingredient_name_trgm'
+CREATE_INDEX_SQL = (
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm '
+    'ON recipes_ingredient USING gin (name gin_trgm_ops)'
+)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX_SQL)
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_index, create_index),
+    ]
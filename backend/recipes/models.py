@@ -1,6 +1,9 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import (FileExtensionValidator, MaxValueValidator,
                                     MinValueValidator)
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
 
 from users.models import User
 from .constants import (CHAR_LIMIT, MAX_COOKING_TIME, MAX_INGREDIENT_NAME_LEN,
@@ -122,6 +125,23 @@ class Recipe(models.Model):
         db_index=True,
         verbose_name='Дата публикации'
     )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        db_index=True,
+        verbose_name='Добавлений в избранное',
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        db_index=True,
+        verbose_name='Добавлений в список покупок',
+    )
 
     class Meta:
         ordering = ('-pub_date',)
@@ -200,6 +220,8 @@ class UserRecipeModel(models.Model):
         verbose_name='Рецепт',
     )
 
+    counter_field = None
+
     class Meta:
         abstract = True
         constraints = (
@@ -216,10 +238,19 @@ class UserRecipeModel(models.Model):
             f'в {self._meta.verbose_name}'
         )
 
+    @classmethod
+    def update_counter(cls, recipe_id, delta):
+        """Атомарно изменяет счетчик добавлений рецепта на `delta`."""
+        Recipe.objects.filter(pk=recipe_id).update(**{
+            cls.counter_field: Greatest(F(cls.counter_field) + delta, 0)
+        })
+
 
 class ShoppingCart(UserRecipeModel):
     """Модель списка покупок."""
 
+    counter_field = 'in_carts_count'
+
     class Meta(UserRecipeModel.Meta):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
@@ -228,6 +259,163 @@ class ShoppingCart(UserRecipeModel):
 class Favorite(UserRecipeModel):
     """Модель избранного."""
 
+    counter_field = 'favorites_count'
+
     class Meta(UserRecipeModel.Meta):
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
+
+
+class ShoppingCartItemManager(models.Manager):
+    """Менеджер, поддерживающий итоги списков покупок в актуальном виде."""
+
+    def apply_recipe(self, user_ids, recipe_id, sign=1):
+        """Прибавляет или вычитает ингредиенты рецепта у пользователей."""
+        self.apply_amounts(
+            user_ids,
+            {
+                ingredient_id: sign * amount
+                for ingredient_id, amount in
+                IngredientInRecipe.objects.filter(
+                    recipe_id=recipe_id
+                ).values_list('ingredient_id', 'amount')
+            }
+        )
+
+    def apply_recipe_amounts(self, recipe_id, amounts):
+        """Изменяет итоги у всех, у кого рецепт есть в списке покупок."""
+        if not any(amounts.values()):
+            return
+        self.apply_amounts(
+            list(
+                ShoppingCart.objects.filter(
+                    recipe_id=recipe_id
+                ).values_list('user_id', flat=True)
+            ),
+            amounts,
+        )
+
+    def apply_amounts(self, user_ids, amounts):
+        """Изменяет итоги ингредиентов в списках покупок пользователей.
+
+        `amounts` - словарь {id ингредиента: изменение кол-ва}. Строки с
+        нулевым итогом удаляются. Строки, которых еще нет, нельзя
+        заблокировать заранее, поэтому прибавление выполняется вставкой,
+        не падающей на конфликте: одновременное первое добавление
+        ингредиента не нарушает уникальность строк итогов.
+        """
+        amounts = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items() if amount
+        }
+        if not user_ids or not amounts:
+            return
+        # Одинаковый порядок строк снижает вероятность взаимных блокировок
+        user_ids = sorted(set(user_ids))
+        additions = {
+            ingredient_id: amount
+            for ingredient_id, amount in sorted(amounts.items()) if amount > 0
+        }
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                self.upsert_amounts(user_ids, additions)
+                amounts = {
+                    ingredient_id: amount
+                    for ingredient_id, amount in amounts.items() if amount < 0
+                }
+                if not amounts:
+                    return
+            else:
+                self.bulk_create(
+                    (
+                        self.model(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            total_amount=0,
+                        )
+                        for user_id in user_ids for ingredient_id in additions
+                    ),
+                    ignore_conflicts=True,
+                )
+            items = self.filter(
+                user_id__in=user_ids, ingredient_id__in=amounts
+            )
+            items.update(total_amount=Greatest(
+                F('total_amount') + Case(
+                    *(
+                        When(ingredient_id=ingredient_id, then=Value(amount))
+                        for ingredient_id, amount in amounts.items()
+                    ),
+                    output_field=models.IntegerField(),
+                ),
+                0,
+            ))
+            items.filter(total_amount=0).delete()
+
+    def upsert_amounts(self, user_ids, amounts):
+        """Прибавляет положительные кол-ва одним запросом в PostgreSQL.
+
+        `INSERT ... ON CONFLICT DO UPDATE` дожидается параллельной вставки
+        той же строки и прибавляет кол-во к ней, а если строку удалили,
+        повторяет вставку.
+        """
+        if not amounts:
+            return
+        quote = connection.ops.quote_name
+        table = quote(self.model._meta.db_table)
+        user, ingredient, total = (
+            quote(self.model._meta.get_field(name).column)
+            for name in ('user', 'ingredient', 'total_amount')
+        )
+        rows = [
+            (user_id, ingredient_id, amount)
+            for user_id in user_ids
+            for ingredient_id, amount in amounts.items()
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({user}, {ingredient}, {total}) '
+                'VALUES ' + ', '.join(['(%s, %s, %s)'] * len(rows))
+                + f' ON CONFLICT ({user}, {ingredient}) '
+                f'DO UPDATE SET {total} = {table}.{total} + EXCLUDED.{total}',
+                [value for row in rows for value in row],
+            )
+
+
+class ShoppingCartItem(models.Model):
+    """Итоговое кол-во ингредиента в списке покупок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_items',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_items',
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Кол-во',
+    )
+
+    objects = ShoppingCartItemManager()
+
+    class Meta:
+        ordering = ('user', 'ingredient')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_user_ingredient',
+            ),
+        )
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+
+    def __str__(self):
+        return (
+            f'{self.user.username}: {self.ingredient.name} '
+            f'{self.total_amount}'
+        )
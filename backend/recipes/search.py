@@ -0,0 +1,62 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, TrigramSimilarity)
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery
+
+from .constants import SEARCH_CONFIG
+from .models import IngredientInRecipe, Recipe
+
+
+def is_full_text_supported():
+    """Полнотекстовый поиск доступен только в PostgreSQL."""
+    return connection.vendor == 'postgresql'
+
+
+def update_search_vector(recipe_ids):
+    """Пересчитывает поисковый вектор по названию, описанию и ингредиентам."""
+    if not is_full_text_supported():
+        return
+    ingredient_names = IngredientInRecipe.objects.filter(
+        recipe=OuterRef('pk')
+    ).values('recipe').annotate(
+        names=StringAgg('ingredient__name', ' ')
+    ).values('names')
+    Recipe.objects.filter(id__in=recipe_ids).update(
+        search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+            + SearchVector(
+                Subquery(ingredient_names), weight='C', config=SEARCH_CONFIG
+            )
+        )
+    )
+
+
+def search_recipes(queryset, value):
+    """Ищет рецепты по названию, описанию и названиям ингредиентов.
+
+    В PostgreSQL результаты ранжируются по релевантности, а при отсутствии
+    совпадений используется триграммный поиск по названию, устойчивый к
+    опечаткам. Похожие названия отбираются оператором `%` по триграммному
+    GIN-индексу с порогом `pg_trgm.similarity_threshold` (по умолчанию
+    0.3), а схожесть вычисляется только для сортировки найденных. В
+    остальных СУБД выполняется поиск по вхождению подстроки без стемминга
+    и ранжирования; SQLite сравнивает без учета регистра только латиницу.
+    """
+    if not is_full_text_supported():
+        return queryset.filter(
+            Q(name__icontains=value)
+            | Q(text__icontains=value)
+            | Q(ingredients__name__icontains=value)
+        ).distinct()
+
+    query = SearchQuery(value, config=SEARCH_CONFIG, search_type='websearch')
+    found = queryset.filter(search_vector=query)
+    if found.exists():
+        return found.annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-pub_date')
+    return queryset.filter(name__trigram_similar=value).annotate(
+        similarity=TrigramSimilarity('name', value)
+    ).order_by('-similarity', '-pub_date')
@@ -0,0 +1,143 @@
+"""Генерация синтетических данных для команды `seed_fake_data`.
+
+Модуль не использует ORM, поэтому функции-производители можно выполнять
+в отдельных процессах. Каждая порция генерируется собственным генератором
+случайных чисел, зависящим только от зерна и номера порции, поэтому
+результат не зависит от кол-ва процессов и порядка их работы.
+"""
+import random
+from datetime import timedelta
+
+# Кол-во пользователей или рецептов в одной порции генерации
+CHUNK_SIZE = 5000
+
+# Степень перекоса популярности рецептов, авторов и ингредиентов
+SKEW = 3
+
+# Блюда для названий рецептов, чтобы поиск находил правдоподобные совпадения
+DISHES = (
+    'Суп', 'Салат', 'Пирог', 'Рагу', 'Запеканка',
+    'Паста', 'Омлет', 'Каша', 'Котлеты', 'Плов',
+)
+RECIPE_TEXT = 'Смешать ингредиенты и готовить до готовности.'
+
+_context = {}
+
+
+def init_worker(context):
+    """Передает процессу-производителю общие параметры генерации."""
+    _context.update(context)
+
+
+def chunk_count(total):
+    return (total + CHUNK_SIZE - 1) // CHUNK_SIZE
+
+
+def skewed_choice(rng, population):
+    """Выбирает элемент с убыванием вероятности к концу списка.
+
+    Первые элементы выбираются заметно чаще остальных, как популярные
+    рецепты, авторы и ингредиенты в реальных данных: на первый 1% списка
+    приходится около пятой части выборок.
+    """
+    return population[int(len(population) * rng.random() ** SKEW)]
+
+
+def sample_skewed(rng, population, count):
+    count = min(count, len(population))
+    chosen = set()
+    while len(chosen) < count:
+        chosen.add(skewed_choice(rng, population))
+    return sorted(chosen)
+
+
+def _chunk(kind, index, total):
+    rng = random.Random(f"{_context['seed']}:{kind}:{index}")
+    start = index * CHUNK_SIZE
+    return rng, range(start, min(start + CHUNK_SIZE, total))
+
+
+def generate_users(index):
+    """Строки пользователей порции `index`."""
+    rng, numbers = _chunk('users', index, _context['users'])
+    prefix = _context['prefix']
+    return {
+        'users': [
+            (
+                _context['first_user_id'] + number,
+                _context['password'],
+                False,
+                f'{prefix}{number}',
+                'Имя',
+                'Фамилия',
+                f'{prefix}{number}@example.com',
+                False,
+                True,
+                _context['now'],
+                0,
+                0,
+                0,
+            )
+            for number in numbers
+        ],
+    }
+
+
+def generate_recipes(index):
+    """Рецепты порции `index` вместе с их тегами и ингредиентами."""
+    rng, numbers = _chunk('recipes', index, _context['recipes'])
+    user_ids = _context['user_ids']
+    tag_ids = _context['tag_ids']
+    ingredient_ids = _context['ingredient_ids']
+    rows = {'recipes': [], 'recipe_tags': [], 'recipe_ingredients': []}
+    for number in numbers:
+        recipe_id = _context['first_recipe_id'] + number
+        rows['recipes'].append((
+            recipe_id,
+            skewed_choice(rng, user_ids),
+            f'{rng.choice(DISHES)} №{number}',
+            _context['image'],
+            RECIPE_TEXT,
+            rng.randint(5, 180),
+            _context['now'] - timedelta(
+                minutes=_context['recipes'] - number
+            ),
+            0,
+            0,
+        ))
+        rows['recipe_tags'].extend(
+            (recipe_id, tag_id)
+            for tag_id in sorted(rng.sample(tag_ids, rng.randint(1, 2)))
+        )
+        rows['recipe_ingredients'].extend(
+            (recipe_id, ingredient_id, rng.randint(1, 500))
+            for ingredient_id in sample_skewed(
+                rng, ingredient_ids, rng.randint(3, 12)
+            )
+        )
+    return rows
+
+
+def generate_user_links(index):
+    """Избранное, корзины и подписки пользователей порции `index`."""
+    rng, numbers = _chunk('links', index, _context['users'])
+    user_ids = _context['user_ids']
+    recipe_ids = _context['recipe_ids']
+    rows = {'favorites': [], 'shopping_carts': [], 'subscriptions': []}
+    for number in numbers:
+        user_id = user_ids[number]
+        for kind, max_count in (('favorites', 30), ('shopping_carts', 5)):
+            rows[kind].extend(
+                (user_id, recipe_id)
+                for recipe_id in sample_skewed(
+                    rng, recipe_ids, rng.randint(0, max_count)
+                )
+            )
+        rows['subscriptions'].extend(
+            (user_id, author_id)
+            for author_id in sample_skewed(
+                rng, user_ids, rng.randint(0, 20)
+            )
+            if author_id != user_id
+        )
+    return rows
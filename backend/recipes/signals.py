@@ -0,0 +1,159 @@
+from collections import defaultdict
+
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .cache import bump_cache_version
+from .ingredient_index import ingredient_index
+from users.models import User
+from .models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                     ShoppingCart, ShoppingCartItem, Tag)
+from .search import update_search_vector
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    """Сбрасывает индекс ингредиентов при их изменении."""
+    ingredient_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_cached_responses(sender, **kwargs):
+    """Сбрасывает закешированные ответы при изменении справочников."""
+    bump_cache_version(sender)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=User)
+def invalidate_cached_object(sender, instance, **kwargs):
+    """Сбрасывает закешированное представление рецепта или автора."""
+    bump_cache_version(sender, instance.pk)
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def invalidate_cached_recipe(instance, **kwargs):
+    """Сбрасывает закешированный рецепт при изменении его ингредиентов."""
+    bump_cache_version(Recipe, instance.recipe_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_cached_recipe_tags(instance, action, reverse, pk_set,
+                                  **kwargs):
+    """Сбрасывает закешированные рецепты при изменении их тегов."""
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_cache_version(Recipe, instance.pk)
+    elif pk_set:
+        for pk in pk_set:
+            bump_cache_version(Recipe, pk)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(instance, raw, **kwargs):
+    """Пересчитывает поисковый вектор рецепта, в том числе из админки."""
+    if not raw:
+        update_search_vector((instance.pk,))
+
+
+@receiver((post_save, post_delete), sender=IngredientInRecipe)
+def update_ingredients_search_vector(instance, **kwargs):
+    """Пересчитывает поисковый вектор при изменении ингредиентов рецепта.
+
+    Массовые вставка и обновление строк сигналов не отправляют, поэтому
+    после них вектор пересчитывается явно.
+    """
+    if not kwargs.get('raw'):
+        update_search_vector((instance.recipe_id,))
+
+
+# Счетчики пересчитываются по сигналам, поэтому учитываются и записи,
+# созданные или удаленные в админке и каскадом. Сигнал об удалении
+# отправляется и тогда, когда строку уже удалил параллельный запрос,
+# поэтому перед удалением из API строка блокируется.
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(instance, created, raw, **kwargs):
+    """Увеличивает счетчик рецептов автора."""
+    if created and not raw:
+        User.update_counters(instance.author_id, recipes_count=1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(instance, **kwargs):
+    """Уменьшает счетчик рецептов автора."""
+    User.update_counters(instance.author_id, recipes_count=-1)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def increment_recipe_counter(sender, instance, created, raw, **kwargs):
+    """Увеличивает счетчик добавлений рецепта в избранное или покупки."""
+    if created and not raw:
+        sender.update_counter(instance.recipe_id, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    """Уменьшает счетчик добавлений рецепта в избранное или покупки."""
+    sender.update_counter(instance.recipe_id, -1)
+
+
+# Итоги списков покупок складываются из пар "рецепт в списке покупок" и
+# "ингредиент рецепта". Пара учитывается, когда появляется вторая из ее
+# строк, и вычитается, когда удаляется первая: при каскадном удалении
+# рецепта или пользователя вторая строка пары уже не находит первую,
+# поэтому итог не вычитается дважды при любом порядке удаления.
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_recipe_to_cart_items(instance, created, raw, **kwargs):
+    """Прибавляет ингредиенты рецепта к итогам списка покупок."""
+    if created and not raw:
+        ShoppingCartItem.objects.apply_recipe(
+            (instance.user_id,), instance.recipe_id
+        )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_recipe_from_cart_items(instance, **kwargs):
+    """Вычитает оставшиеся ингредиенты рецепта из итогов списка покупок."""
+    ShoppingCartItem.objects.apply_recipe(
+        (instance.user_id,), instance.recipe_id, sign=-1
+    )
+
+
+@receiver(pre_save, sender=IngredientInRecipe)
+def remember_saved_ingredient(instance, raw, **kwargs):
+    """Запоминает сохраненные в БД значения строки до ее изменения."""
+    instance.saved_values = None
+    if not raw and not instance._state.adding:
+        instance.saved_values = IngredientInRecipe.objects.filter(
+            pk=instance.pk
+        ).values_list('recipe_id', 'ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+def apply_ingredient_to_cart_items(instance, raw, **kwargs):
+    """Переносит изменение ингредиента рецепта в итоги списков покупок."""
+    if raw:
+        return
+    changes = defaultdict(lambda: defaultdict(int))
+    changes[instance.recipe_id][instance.ingredient_id] += instance.amount
+    if instance.saved_values is not None:
+        recipe_id, ingredient_id, amount = instance.saved_values
+        changes[recipe_id][ingredient_id] -= amount
+    for recipe_id, amounts in changes.items():
+        ShoppingCartItem.objects.apply_recipe_amounts(recipe_id, amounts)
+
+
+@receiver(post_delete, sender=IngredientInRecipe)
+def remove_ingredient_from_cart_items(instance, **kwargs):
+    """Вычитает ингредиент из итогов списков покупок с его рецептом."""
+    ShoppingCartItem.objects.apply_recipe_amounts(
+        instance.recipe_id, {instance.ingredient_id: -instance.amount}
+    )
@@ -0,0 +1,72 @@
+import hashlib
+import os
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import models
+
+from .constants import (DERIVATIVES_DIR, IMAGE_DERIVATIVE_FORMATS,
+                        IMAGE_RENDITIONS)
+from .images import derivative_name, manifest_name
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище, именующее загружаемые файлы по их содержимому.
+
+    Файл сохраняется как `<каталог>/<xx>/<sha256><расширение>`, поэтому
+    повторная загрузка того же изображения не создает новый файл.
+    Производные изображения сохраняются под переданными именами.
+
+    Общий файл может понадобиться новой записи в любой момент, поэтому
+    хранилище файлы не удаляет: неиспользуемые удаляет команда `gc_media`.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        if name.startswith(f'{DERIVATIVES_DIR}/'):
+            return super().save(name, content, max_length=max_length)
+
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory, file_name = os.path.split(name)
+        name = os.path.join(
+            directory,
+            digest[:2],
+            digest + os.path.splitext(file_name)[1].lower(),
+        )
+        if self.exists(name):
+            # Повторная загрузка продлевает жизнь файла: `gc_media` не
+            # удалит его, пока ссылающаяся запись еще не зафиксирована
+            os.utime(self.path(name))
+            return name
+        return self._save(name, content)
+
+
+def file_fields():
+    """Поля моделей, хранящие файлы в хранилище по умолчанию."""
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if (
+                isinstance(field, models.FileField)
+                and field.storage is default_storage
+            ):
+                yield model, field
+
+
+def delete_blob(name):
+    """Удаляет файл вместе с его производными изображениями."""
+    default_storage.delete(name)
+    default_storage.delete(manifest_name(name))
+    for rendition, widths in IMAGE_RENDITIONS.items():
+        for width in widths:
+            for extension in IMAGE_DERIVATIVE_FORMATS:
+                default_storage.delete(
+                    derivative_name(name, rendition, width, extension)
+                )
@@ -0,0 +1,530 @@
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.db.models.signals import post_delete
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from recipes.constants import RECIPE_IMAGE_RENDITIONS
+from recipes.images import (cached_manifest, derivative_name,
+                            derivative_srcsets, generate_derivatives,
+                            manifest_name, read_manifest)
+from recipes.management.commands.import_data import iter_json_array
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, ShoppingCartItem, Tag)
+from recipes.units import to_readable_unit
+from users.models import Subscription, User
+
+
+def create_author():
+    return User.objects.create_user(
+        username='author',
+        email='author@example.com',
+        first_name='author',
+        last_name='author',
+        password='password',
+    )
+
+
+def jpeg(width, height):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), 'orange').save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class MediaRootMixin:
+    """Подменяет MEDIA_ROOT временным каталогом."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = self.settings(MEDIA_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cached_manifest.cache_clear()
+
+    def save(self, content, name='recipes/images/image.jpg'):
+        return default_storage.save(name, ContentFile(content))
+
+    def make_stale(self, name, age=7200):
+        timestamp = time.time() - age
+        os.utime(default_storage.path(name), (timestamp, timestamp))
+
+    def modified(self, name):
+        return default_storage.get_modified_time(name).timestamp()
+
+
+class ContentAddressedStorageTests(MediaRootMixin, TestCase):
+    """Хранение файлов по хешу содержимого."""
+
+    def test_same_content_shares_file(self):
+        name = self.save(b'image')
+        self.assertRegex(name, r'^recipes/images/\w\w/\w{64}\.jpg$')
+        self.assertEqual(self.save(b'image', 'recipes/images/copy.JPG'), name)
+        self.assertNotEqual(self.save(b'other'), name)
+
+    def test_reupload_refreshes_modified_time(self):
+        name = self.save(b'image')
+        self.make_stale(name)
+        stale = self.modified(name)
+        self.save(b'image')
+        self.assertGreater(self.modified(name), stale + 3600)
+
+
+class GarbageCollectMediaTests(MediaRootMixin, TestCase):
+    """Удаление неиспользуемых файлов командой gc_media."""
+
+    def setUp(self):
+        super().setUp()
+        self.referenced = self.save(b'referenced')
+        Recipe.objects.create(
+            author=create_author(),
+            name='Рецепт',
+            text='Описание',
+            cooking_time=10,
+            image=self.referenced,
+        )
+        self.orphan = self.save(b'orphan')
+        self.derivative = default_storage.save(
+            derivative_name(self.orphan, 'card', 400, 'webp'),
+            ContentFile(b'derivative'),
+        )
+        self.manifest = default_storage.save(
+            manifest_name(self.orphan), ContentFile(b'{}')
+        )
+        self.young = self.save(b'young')
+        for name in (
+            self.referenced, self.orphan, self.derivative, self.manifest
+        ):
+            self.make_stale(name)
+
+    def gc_media(self, *args):
+        call_command('gc_media', *args, stdout=io.StringIO())
+
+    def test_removes_stale_orphans(self):
+        self.gc_media()
+        self.assertTrue(default_storage.exists(self.referenced))
+        self.assertTrue(default_storage.exists(self.young))
+        self.assertFalse(default_storage.exists(self.orphan))
+        self.assertFalse(default_storage.exists(self.derivative))
+        self.assertFalse(default_storage.exists(self.manifest))
+
+    def test_keeps_reuploaded_orphan(self):
+        # Запись, сославшаяся на уже существующий файл, еще не
+        # зафиксирована, но файл моложе --min-age
+        self.assertEqual(self.save(b'orphan'), self.orphan)
+        self.gc_media()
+        self.assertTrue(default_storage.exists(self.orphan))
+
+    def test_dry_run(self):
+        self.gc_media('--dry-run')
+        self.assertTrue(default_storage.exists(self.orphan))
+        self.assertTrue(default_storage.exists(self.derivative))
+
+
+class ImageDerivativesTests(MediaRootMixin, TestCase):
+    """Производные изображения и их `srcset`."""
+
+    def setUp(self):
+        super().setUp()
+        self.name = self.save(jpeg(500, 300))
+        self.recipe = Recipe(image=self.name)
+
+    def test_widths_follow_output_size(self):
+        manifest = generate_derivatives(self.name, RECIPE_IMAGE_RENDITIONS)
+        # Изображение не увеличивается: 640 и 960 дают копии шириной 500,
+        # а 1280 - повтор копии для 960
+        self.assertEqual(manifest, {
+            'card': [[320, 320], [640, 500]],
+            'detail': [[960, 500]],
+        })
+        self.assertEqual(read_manifest(self.name), manifest)
+        for rendition, width, exists in (
+            ('card', 320, True),
+            ('card', 640, True),
+            ('detail', 960, True),
+            ('detail', 1280, False),
+        ):
+            for extension in ('webp', 'jpeg'):
+                self.assertEqual(
+                    default_storage.exists(derivative_name(
+                        self.name, rendition, width, extension
+                    )),
+                    exists,
+                )
+
+    def test_srcsets(self):
+        self.assertIsNone(
+            derivative_srcsets(self.recipe.image, ('card',), str)
+        )
+        generate_derivatives(self.name, RECIPE_IMAGE_RENDITIONS)
+        srcsets = derivative_srcsets(self.recipe.image, ('card',), str)
+        stem = os.path.splitext(self.name)[0]
+        self.assertEqual(
+            srcsets['card']['webp'],
+            f'/media/derivatives/{stem}-card-320.webp 320w, '
+            f'/media/derivatives/{stem}-card-640.webp 500w',
+        )
+
+    def test_backfill(self):
+        self.recipe.author = create_author()
+        self.recipe.name = 'Рецепт'
+        self.recipe.text = 'Описание'
+        self.recipe.cooking_time = 10
+        self.recipe.save()
+        stdout = io.StringIO()
+        call_command('backfill_derivatives', '--dry-run', stdout=stdout)
+        self.assertIn('Missing: 1', stdout.getvalue())
+        self.assertEqual(read_manifest(self.name), {})
+        call_command('backfill_derivatives', stdout=io.StringIO())
+        self.assertEqual(
+            set(read_manifest(self.name)), set(RECIPE_IMAGE_RENDITIONS)
+        )
+        stdout = io.StringIO()
+        call_command('backfill_derivatives', stdout=stdout)
+        self.assertIn('Missing: 0', stdout.getvalue())
+
+
+class ImportDataTests(TestCase):
+    """Загрузка справочников командой import_data."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def import_data(self, tags, ingredients, *args):
+        stdout = io.StringIO()
+        call_command(
+            'import_data',
+            f'--tags={tags}',
+            f'--ingredients={ingredients}',
+            '--batch-size=2',
+            *args,
+            stdout=stdout,
+        )
+        return stdout.getvalue()
+
+    def test_json_array_parser(self):
+        items = [
+            {'name': 'Соль, [крупная]', 'measurement_unit': 'г'},
+            {'name': '"Кавычки" и \\', 'nested': {'list': [1, 2]}},
+            'строка',
+            [],
+        ]
+        content = json.dumps(items, ensure_ascii=False, indent=2)
+        for chunk_size in (1, 7, len(content)):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(
+                    list(iter_json_array(io.StringIO(content), chunk_size)),
+                    items,
+                )
+        for content in ('{}', '[1, 2', '[1 2]'):
+            with self.subTest(content=content):
+                with self.assertRaises(ValueError):
+                    list(iter_json_array(io.StringIO(content), 2))
+
+    def test_import_is_idempotent(self):
+        tags = self.write('tags.json', json.dumps([
+            {'name': 'Завтрак', 'slug': 'breakfast'},
+            {'name': 'Обед', 'slug': 'lunch'},
+            {'name': 'Ужин', 'slug': 'dinner'},
+        ]))
+        ingredients = self.write('ingredients.csv', (
+            'name,measurement_unit\n'
+            'Соль,г\n'
+            'Молоко,мл\n'
+            ',г\n'
+            'Мука,г\n'
+        ))
+        output = self.import_data(tags, ingredients)
+        self.assertIn('`TAG`: inserted 3, updated 0, skipped 0', output)
+        self.assertIn(
+            '`INGREDIENT`: inserted 3, updated 0, skipped 1', output
+        )
+        output = self.import_data(tags, ingredients)
+        self.assertIn('`TAG`: inserted 0, updated 0, skipped 3', output)
+        self.assertIn(
+            '`INGREDIENT`: inserted 0, updated 0, skipped 4', output
+        )
+        ingredients = self.write('ingredients.csv', 'Соль,кг\nСахар,г\n')
+        output = self.import_data(tags, ingredients)
+        self.assertIn(
+            '`INGREDIENT`: inserted 1, updated 1, skipped 0', output
+        )
+        self.assertEqual(
+            Ingredient.objects.get(name='Соль').measurement_unit, 'кг'
+        )
+        self.assertEqual(Ingredient.objects.count(), 4)
+
+    def test_dry_run(self):
+        tags = self.write('tags.csv', 'Завтрак,breakfast\n')
+        ingredients = self.write('ingredients.json', '[]')
+        output = self.import_data(tags, ingredients, '--dry-run')
+        self.assertIn('`TAG`: inserted 1, updated 0, skipped 0', output)
+        self.assertFalse(Tag.objects.exists())
+
+    def test_tag_name_conflicts_are_skipped(self):
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+        Tag.objects.create(name='Обед', slug='lunch')
+        tags = self.write('tags.csv', (
+            'name,slug\n'
+            'Завтрак,morning\n'
+            'Второй завтрак,brunch\n'
+            'Ужин,dinner\n'
+            'Ужин,supper\n'
+            'Обед и ужин,lunch\n'
+        ))
+        ingredients = self.write('ingredients.json', '[]')
+        output = self.import_data(tags, ingredients)
+        self.assertIn('`TAG`: inserted 2, updated 1, skipped 2', output)
+        self.assertIn('SUCCESSFULLY LOADED `TAG` DATA', output)
+        self.assertIn(
+            'name `Завтрак` is already used by slug `breakfast`', output
+        )
+        self.assertIn('name `Ужин` is already used by slug `dinner`', output)
+        self.assertEqual(
+            dict(Tag.objects.values_list('slug', 'name')),
+            {
+                'breakfast': 'Завтрак',
+                'brunch': 'Второй завтрак',
+                'dinner': 'Ужин',
+                'lunch': 'Обед и ужин',
+            },
+        )
+
+
+class BenchmarkIngredientSearchTests(TestCase):
+    """Замер поиска ингредиентов командой benchmark_ingredient_search."""
+
+    def test_benchmark(self):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('Salt', 'Sea salt', 'Sugar')
+        )
+        stdout = io.StringIO()
+        call_command(
+            'benchmark_ingredient_search', '--repeat=1', stdout=stdout
+        )
+        output = stdout.getvalue()
+        self.assertIn('Lookups: 3', output)
+        self.assertRegex(output, r'Prefix: index .* speedup x')
+        self.assertRegex(output, r'Substring: index .* speedup x')
+
+
+class ReadableUnitTests(SimpleTestCase):
+    """Перевод кол-ва в наиболее крупную единицу измерения."""
+
+    def convert(self, amount, unit):
+        item = to_readable_unit({
+            'name': 'Ингредиент',
+            'total_amount': amount,
+            'measurement_unit': unit,
+        })
+        return item['total_amount'], item['measurement_unit']
+
+    def test_conversions(self):
+        for amount, unit, expected in (
+            (2000, 'г', (2, 'кг')),
+            (1500, 'г', (1.5, 'кг')),
+            (1250, 'г', (1250, 'г')),
+            (999, 'г', (999, 'г')),
+            (3500, 'мл', (3.5, 'L')),
+            (9, 'ч. л.', (3, 'ст. л.')),
+            (4, 'ч. л.', (4, 'ч. л.')),
+            (7, 'шт.', (7, 'шт.')),
+        ):
+            with self.subTest(amount=amount, unit=unit):
+                self.assertEqual(self.convert(amount, unit), expected)
+
+
+class PeriodicTasksTests(TestCase):
+    """Запуск служебных команд по расписанию."""
+
+    @mock.patch(
+        'recipes.management.commands.run_periodic_tasks.connections'
+    )
+    def test_runs_commands_and_survives_failures(self, connections):
+        author = create_author()
+        User.objects.filter(pk=author.pk).update(recipes_count=5)
+        with self.settings(PERIODIC_COMMANDS={
+            'missing_command': 60, 'reconcile_counters': 60
+        }):
+            with self.assertLogs(
+                'recipes.management.commands.run_periodic_tasks', 'ERROR'
+            ):
+                call_command(
+                    'run_periodic_tasks', '--once', stdout=io.StringIO()
+                )
+        author.refresh_from_db()
+        self.assertEqual(author.recipes_count, 0)
+        self.assertEqual(connections.close_all.call_count, 2)
+
+
+class SeedFakeDataTests(MediaRootMixin, TransactionTestCase):
+    """Генерация синтетических данных командой seed_fake_data.
+
+    Команда закрывает соединения с БД перед запуском процессов, поэтому
+    тест выполняется вне транзакции.
+    """
+
+    def setUp(self):
+        super().setUp()
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {number}', slug=f'tag-{number}')
+            for number in range(3)
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(20)
+        )
+
+    def seed(self, *args):
+        call_command(
+            'seed_fake_data',
+            '--users=20',
+            '--recipes=50',
+            '--seed=1',
+            *args,
+            stdout=io.StringIO(),
+        )
+        return (
+            list(Recipe.objects.order_by('id').values_list(
+                'name', 'author__username', 'cooking_time'
+            )),
+            sorted(Favorite.objects.values_list(
+                'user__username', 'recipe__name'
+            )),
+            sorted(Subscription.objects.values_list(
+                'user__username', 'author__username'
+            )),
+        )
+
+    def assertDerivedDataConsistent(self):
+        expected = {
+            (row['user'], row['ingredient']): row['total_amount']
+            for row in ShoppingCart.objects.values(
+                'user',
+                ingredient=F('recipe__ingredients_in_recipe__ingredient'),
+            ).annotate(
+                total_amount=Sum('recipe__ingredients_in_recipe__amount')
+            ).order_by()
+        }
+        self.assertEqual(
+            {
+                (item.user_id, item.ingredient_id): item.total_amount
+                for item in ShoppingCartItem.objects.all()
+            },
+            expected,
+        )
+        stdout = io.StringIO()
+        call_command('reconcile_counters', '--verify', stdout=stdout)
+        self.assertNotRegex(stdout.getvalue(), r': [1-9]\d* wrong')
+
+    def test_seed(self):
+        self.seed('--workers=1')
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Recipe.objects.count(), 50)
+        self.assertFalse(
+            IngredientInRecipe.objects.filter(amount__lte=0).exists()
+        )
+        self.assertDerivedDataConsistent()
+        image = Recipe.objects.values_list('image', flat=True).first()
+        self.assertEqual(
+            set(read_manifest(image)), set(RECIPE_IMAGE_RENDITIONS)
+        )
+
+    def test_same_seed_gives_same_data(self):
+        data = self.seed('--workers=1')
+        self.assertEqual(self.seed('--workers=2', '--flush'), data)
+
+    def test_flush_keeps_other_users(self):
+        self.seed('--workers=1')
+        author = create_author()
+        seeded_recipe = Recipe.objects.first()
+        ShoppingCart.objects.create(user=author, recipe=seeded_recipe)
+        Favorite.objects.create(user=author, recipe=seeded_recipe)
+        Subscription.objects.create(user=author, author=seeded_recipe.author)
+        Token.objects.create(user=seeded_recipe.author)
+        receiver = mock.Mock()
+        post_delete.connect(receiver)
+        self.addCleanup(post_delete.disconnect, receiver)
+        self.seed('--workers=1', '--flush')
+        receiver.assert_not_called()
+        self.assertTrue(User.objects.filter(id=author.id).exists())
+        self.assertEqual(User.objects.count(), 21)
+        self.assertFalse(ShoppingCartItem.objects.filter(user=author).exists())
+        self.assertDerivedDataConsistent()
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Нужен PostgreSQL')
+class ShoppingCartItemConcurrencyTests(TransactionTestCase):
+    """Одновременное изменение итогов списка покупок."""
+
+    def setUp(self):
+        self.user = create_author()
+        self.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(3)
+        )
+
+    def apply_concurrently(self, *amounts):
+        barrier = threading.Barrier(len(amounts))
+        errors = []
+
+        def apply(amounts):
+            try:
+                with transaction.atomic():
+                    barrier.wait()
+                    ShoppingCartItem.objects.apply_amounts(
+                        (self.user.id,), amounts
+                    )
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=apply, args=(item,)) for item in amounts
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return dict(ShoppingCartItem.objects.filter(
+            user=self.user
+        ).values_list('ingredient', 'total_amount'))
+
+    def test_first_additions_are_summed(self):
+        first, second, third = (
+            ingredient.id for ingredient in self.ingredients
+        )
+        self.assertEqual(
+            self.apply_concurrently(
+                {first: 5, second: 1}, {first: 7, third: 2}, {first: 1}
+            ),
+            {first: 13, second: 1, third: 2},
+        )
+        self.assertEqual(
+            self.apply_concurrently({first: -13, second: 4}, {second: -1}),
+            {second: 4, third: 2},
+        )
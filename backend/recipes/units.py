@@ -0,0 +1,50 @@
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .constants import UNIT_CONVERSIONS
+
+# Единицы, в которые можно укрупнить базовую: базовая -> [(единица, коэф.)]
+READABLE_UNITS = {}
+for unit, (base_unit, factor) in UNIT_CONVERSIONS.items():
+    if factor > 1:
+        READABLE_UNITS.setdefault(base_unit, []).append((unit, factor))
+for units in READABLE_UNITS.values():
+    units.sort(key=lambda unit: unit[1], reverse=True)
+
+
+def base_unit(unit_field):
+    """Выражение БД, приводящее единицу измерения к базовой."""
+    return Case(
+        *(
+            When(**{unit_field: unit}, then=Value(base))
+            for unit, (base, factor) in UNIT_CONVERSIONS.items()
+            if factor > 1
+        ),
+        default=F(unit_field),
+    )
+
+
+def base_amount(amount_field, unit_field):
+    """Выражение БД, переводящее кол-во в базовую единицу измерения."""
+    return F(amount_field) * Case(
+        *(
+            When(**{unit_field: unit}, then=Value(factor))
+            for unit, (_, factor) in UNIT_CONVERSIONS.items()
+            if factor > 1
+        ),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+
+
+def to_readable_unit(item):
+    """Переводит кол-во в наиболее крупную единицу без длинных дробей."""
+    amount = item['total_amount']
+    for unit, factor in READABLE_UNITS.get(item['measurement_unit'], ()):
+        if amount >= factor and amount * 10 % factor == 0:
+            amount /= factor
+            return {
+                **item,
+                'total_amount': int(amount) if amount.is_integer() else amount,
+                'measurement_unit': unit,
+            }
+    return item
@@ -16,7 +16,8 @@ class UserAdmin(BaseUserAdmin):
         'first_name',
         'last_name',
         'recipes_count',
-        'subscribers_count',
+        'followers_count',
+        'following_count',
     )
     list_editable = (
         'first_name',
@@ -31,16 +32,6 @@ class UserAdmin(BaseUserAdmin):
         'username',
     )
 
-    @admin.display(description='Рецепты')
-    def recipes_count(self, obj):
-        """Считает кол-во рецептов пользователя."""
-        return obj.recipes.count()
-
-    @admin.display(description='Подписчики')
-    def subscribers_count(self, obj):
-        """Считает кол-во подписчиков пользователя."""
-        return obj.subscribed_to.count()
-
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
@@ -1,6 +1,8 @@
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import FileExtensionValidator
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.forms import ValidationError
 
 from .constants import (CHAR_LIMIT, MAX_EMAIL_LEN, MAX_FIRST_NAME_LEN,
@@ -42,6 +44,21 @@ class User(AbstractUser):
         ],
         verbose_name='Изображение аватара',
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецепты',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчики',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписки',
+    )
 
     class Meta:
         ordering = ('username',)
@@ -51,6 +68,14 @@ class User(AbstractUser):
     def __str__(self):
         return self.username[:CHAR_LIMIT]
 
+    @classmethod
+    def update_counters(cls, pk, **deltas):
+        """Атомарно изменяет счетчики пользователя на переданные величины."""
+        cls.objects.filter(pk=pk).update(**{
+            field: Greatest(F(field) + delta, 0)
+            for field, delta in deltas.items()
+        })
+
 
 class Subscription(models.Model):
     """Модель подписки."""
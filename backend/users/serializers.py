@@ -1,22 +1,12 @@
-import base64
-
-from django.core.files.base import ContentFile
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from api.fields import Base64ImageField, ImageDerivativesField
+from recipes.constants import AVATAR_RENDITIONS, RECIPE_CARD_RENDITIONS
+from recipes.images import schedule_derivatives
 from recipes.models import Recipe
 from users.models import Subscription, User
-
-
-class Base64ImageField(serializers.ImageField):
-    def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
-        return super().to_internal_value(data)
+from users.utils import get_recipes_limit, get_subscribed_author_ids
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -51,6 +41,10 @@ class UserSerializer(serializers.ModelSerializer):
     """Сериализатор для пользователя."""
 
     is_subscribed = serializers.SerializerMethodField()
+    avatar_set = ImageDerivativesField(
+        source='avatar',
+        renditions=AVATAR_RENDITIONS,
+    )
 
     class Meta:
         model = User
@@ -62,15 +56,12 @@ class UserSerializer(serializers.ModelSerializer):
             'last_name',
             'is_subscribed',
             'avatar',
+            'avatar_set',
         )
         read_only_fields = ('id', 'is_subscribed', 'avatar')
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        return (
-            user.is_authenticated
-            and Subscription.objects.filter(user=user, author=obj).exists()
-        )
+        return obj.id in get_subscribed_author_ids(self.context.get('request'))
 
 
 class UserAvatarSerializer(UserSerializer):
@@ -89,23 +80,31 @@ class UserAvatarSerializer(UserSerializer):
             )
         return data
 
+    def update(self, instance, validated_data):
+        old_avatar = instance.avatar.name
+        instance = super().update(instance, validated_data)
+        if instance.avatar.name != old_avatar:
+            schedule_derivatives(instance.avatar, AVATAR_RENDITIONS)
+        return instance
+
 
 class RecipeShortSerializer(serializers.ModelSerializer):
     """Информации о рецепте в корзине и избранном."""
 
+    image_set = ImageDerivativesField(
+        source='image',
+        renditions=RECIPE_CARD_RENDITIONS,
+    )
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_set', 'cooking_time')
 
 
 class SubscriptionReceiveSerializer(UserSerializer):
     """Сериализатор для получения подписок."""
 
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(
-        read_only=True,
-        default=0
-    )
 
     class Meta(UserSerializer.Meta):
         fields = UserSerializer.Meta.fields + (
@@ -115,15 +114,11 @@ class SubscriptionReceiveSerializer(UserSerializer):
 
     def get_recipes(self, obj):
         """Получить список рецептов."""
-        recipes = obj.recipes.all()
-        request = self.context.get('request')
-        if request:
-            recipes_limit = request.query_params.get('recipes_limit')
-            if recipes_limit:
-                try:
-                    recipes = recipes[:int(recipes_limit)]
-                except (ValueError, TypeError):
-                    pass
+        recipes = getattr(obj, 'recipes_preview', None)
+        if recipes is None:
+            recipes = obj.recipes.all()[
+                :get_recipes_limit(self.context.get('request'))
+            ]
 
         return RecipeShortSerializer(
             recipes, context=self.context, many=True
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Subscription, User
+
+
+@receiver(post_save, sender=Subscription)
+def increment_subscription_counters(instance, created, raw, **kwargs):
+    """Увеличивает счетчики подписок и подписчиков."""
+    if created and not raw:
+        User.update_counters(instance.user_id, following_count=1)
+        User.update_counters(instance.author_id, followers_count=1)
+
+
+@receiver(post_delete, sender=Subscription)
+def decrement_subscription_counters(instance, **kwargs):
+    """Уменьшает счетчики подписок и подписчиков."""
+    User.update_counters(instance.user_id, following_count=-1)
+    User.update_counters(instance.author_id, followers_count=-1)
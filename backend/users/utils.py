@@ -0,0 +1,72 @@
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from recipes.models import Recipe
+from users.models import Subscription
+
+
+def get_subscribed_author_ids(request):
+    """Возвращает множество id авторов, на которых подписан пользователь.
+
+    Множество загружается одним запросом и кешируется на объекте запроса,
+    поэтому все сериализаторы, встраивающие пользователей, используют его
+    совместно.
+    """
+    if request is None or not request.user.is_authenticated:
+        return frozenset()
+    author_ids = getattr(request, 'subscribed_author_ids', None)
+    if author_ids is None:
+        author_ids = set(
+            Subscription.objects.filter(
+                user=request.user
+            ).values_list('author_id', flat=True)
+        )
+        request.subscribed_author_ids = author_ids
+    return author_ids
+
+
+def get_recipes_limit(request):
+    """Возвращает ограничение на кол-во рецептов из параметра запроса."""
+    if request is None:
+        return None
+    try:
+        recipes_limit = int(request.query_params.get('recipes_limit'))
+    except (ValueError, TypeError):
+        return None
+    return recipes_limit if recipes_limit > 0 else None
+
+
+def prefetch_recipes_preview(authors, recipes_limit=None):
+    """Загружает последние рецепты авторов одним запросом.
+
+    Рецепты нумеруются ROW_NUMBER() в окне по автору во вложенном запросе,
+    внешний запрос оставляет первые `recipes_limit` строк каждого окна.
+    Рецепты авторов страницы читаются один раз, без подзапроса на каждый
+    рецепт. Результат сохраняется в `recipes_preview` каждого автора.
+    """
+    authors = list(authors)
+    if not authors:
+        return authors
+    queryset = Recipe.objects.filter(author__in=authors)
+    if recipes_limit is None:
+        recipes = queryset.order_by('-pub_date', '-id')
+    else:
+        sql, params = queryset.annotate(
+            row_number=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            )
+        ).order_by().query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) AS preview '
+            'WHERE preview.row_number <= %s '
+            'ORDER BY preview.pub_date DESC, preview.id DESC',
+            (*params, recipes_limit),
+        )
+    previews = {author.pk: [] for author in authors}
+    for recipe in recipes:
+        previews[recipe.author_id].append(recipe)
+    for author in authors:
+        author.recipes_preview = previews[author.pk]
+    return authors
@@ -1,5 +1,5 @@
 from django.contrib.auth import authenticate, update_session_auth_hash
-from django.db.models import Count
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import filters, status, viewsets
 from rest_framework.authtoken.models import Token
@@ -8,15 +8,18 @@ from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
-from api.pagination import LimitPagination
+from api.pagination import (ApproximateCountPagination, CursorPaginationMixin,
+                            LimitPagination, SubscriptionCursorPagination)
+from foodgram.metrics import MetricsViewMixin
 from users.models import User, Subscription
 from users.serializers import (SubscribeToSerializer,
                                SubscriptionReceiveSerializer,
                                UserAvatarSerializer, UserCreateSerializer,
                                UserSerializer)
+from users.utils import get_recipes_limit, prefetch_recipes_preview
 
 
-class LoginView(ObtainAuthToken):
+class LoginView(MetricsViewMixin, ObtainAuthToken):
 
     def post(self, request, *args, **kwargs):
         email = request.data.get('email')
@@ -33,7 +36,7 @@ class LoginView(ObtainAuthToken):
         })
 
 
-class LogoutView(ObtainAuthToken):
+class LogoutView(MetricsViewMixin, ObtainAuthToken):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
@@ -43,12 +46,14 @@ class LogoutView(ObtainAuthToken):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(
+    MetricsViewMixin, CursorPaginationMixin, viewsets.ModelViewSet
+):
     """Вьюсет для юзера."""
 
     queryset = User.objects.all()
     serializer_class = UserSerializer
-    pagination_class = LimitPagination
+    pagination_class = ApproximateCountPagination
     filter_backends = (filters.SearchFilter,)
     search_fields = ('username',)
 
@@ -111,31 +116,35 @@ class UserViewSet(viewsets.ModelViewSet):
         """Удаляет аватар пользователя."""
         user = request.user
 
+        # Сам файл удаляет команда gc_media, когда на него не останется ссылок
         if user.avatar:
-            user.avatar.delete()
+            user.avatar = None
+            user.save(update_fields=('avatar',))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
         detail=False,
         pagination_class=LimitPagination,
+        cursor_pagination_class=SubscriptionCursorPagination,
         permission_classes=(IsAuthenticated,),
     )
     def subscriptions(self, request):
         """Возвращает все подписки пользователя."""
         queryset = User.objects.filter(
             subscribed_to__user=request.user
-        ).annotate(recipes_count=Count('recipes')).order_by('username')
+        ).order_by('username')
 
         page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = SubscriptionReceiveSerializer(
-                page, many=True, context={'request': request}
-            )
-            return self.get_paginated_response(serializer.data)
-
         serializer = SubscriptionReceiveSerializer(
-            queryset, many=True, context={'request': request}
+            prefetch_recipes_preview(
+                queryset if page is None else page,
+                get_recipes_limit(request),
+            ),
+            many=True,
+            context={'request': request},
         )
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
         return Response(serializer.data)
 
     @action(
@@ -161,15 +170,19 @@ class UserViewSet(viewsets.ModelViewSet):
 
     @subscribe.mapping.delete
     def unsubscribe(self, request, pk):
-        """Отписаться от пользователя."""
-        user = request.user
+        """Отписаться от пользователя.
+
+        Подписка блокируется перед удалением, поэтому при одновременных
+        запросах счетчики уменьшаются сигналами один раз.
+        """
         author = get_object_or_404(User, pk=pk)
-        follow = Subscription.objects.filter(
-            user=user,
-            author=author
-        ).first()
-        if follow:
-            follow.delete()
+        follows = Subscription.objects.filter(
+            user=request.user, author=author
+        )
+        with transaction.atomic():
+            list(follows.select_for_update())
+            deleted, _ = follows.delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {'errors': 'Подписка не найдена.'},
@@ -0,0 +1,320 @@
+"""Сценарии нагрузочного тестирования API Foodgram.
+
+Пользователи и рецепты создаются командой `seed_fake_data`, все
+сгенерированные пользователи имеют пароль `SEED_PASSWORD`.
+"""
+import json
+import logging
+import os
+import random
+import re
+from pathlib import Path
+
+import requests
+from locust import HttpUser, between, events, task
+
+SEED_PREFIX = os.getenv('SEED_PREFIX', 'bench')
+SEED_USERS = int(os.getenv('SEED_USERS', 1000))
+SEED_PASSWORD = os.getenv('SEED_PASSWORD', 'benchmark-password')
+
+# ASGI-сервер асинхронного пути чтения: если задан, лента, рецепты, теги и
+# ингредиенты запрашиваются у него по адресам `/api/async/...`
+ASYNC_HOST = os.getenv('ASYNC_HOST')
+
+ROOT_PATH = Path(__file__).resolve().parent.parent
+DATA_PATH = ROOT_PATH / 'backend' / 'data'
+POSTMAN_COLLECTION = (
+    ROOT_PATH / 'postman_collection' / 'foodgram.postman_collection.json'
+)
+TAGS = [
+    tag['slug']
+    for tag in json.loads((DATA_PATH / 'tags.json').read_text('utf-8'))
+]
+INGREDIENT_PREFIXES = sorted({
+    ingredient['name'][:length]
+    for ingredient in json.loads(
+        (DATA_PATH / 'ingredients.json').read_text('utf-8')
+    )
+    for length in (1, 2, 3)
+})
+SEARCH_TERMS = ('суп', 'салат', 'пирог', 'каша', 'котлеты')
+
+# Значения переменных коллекции Postman для пользователя `PostmanReader`
+POSTMAN_VARIABLE = re.compile(r'\{\{(\w+)\}\}')
+POSTMAN_VARIABLES = {
+    'baseUrl': lambda user: '',
+    'userId': lambda user: user.user_id,
+    'firstTagId': lambda user: random.choice(user.tags)['id'],
+    'secondTagSlug': lambda user: random.choice(user.tags)['slug'],
+    'thirdTagSlug': lambda user: random.choice(user.tags)['slug'],
+    'firstIndredientId': lambda user: random.choice(user.ingredient_ids),
+    'ingredientNameFirstLatter': (
+        lambda user: random.choice(INGREDIENT_PREFIXES)
+    ),
+    'firstRecipeId': lambda user: random.choice(user.recipe_ids),
+}
+
+QUERIES_LINE = re.compile(r'^foodgram_db_queries_(count|sum)\{(.*)\} (\S+)$')
+LABEL = re.compile(r'(\w+)="([^"]*)"')
+
+logger = logging.getLogger(__name__)
+
+# Счетчики /metrics на начало прогона
+_metrics = {}
+
+
+def read_query_metrics(host):
+    """Читает кол-во запросов к БД по эндпоинтам из /metrics серверов.
+
+    Возвращает None, если /metrics какого-либо из серверов недоступен.
+    """
+    totals = {}
+    for server in filter(None, (host, ASYNC_HOST)):
+        try:
+            response = requests.get(f'{server}/metrics', timeout=10)
+            response.raise_for_status()
+        except requests.RequestException as error:
+            logger.warning('DB query metrics are unavailable: %s', error)
+            return None
+        for line in response.text.splitlines():
+            match = QUERIES_LINE.match(line)
+            if match is None:
+                continue
+            kind, labels, value = match.groups()
+            labels = dict(LABEL.findall(labels))
+            key = f"{labels['method']} {labels['endpoint']}"
+            totals.setdefault(key, {})[kind] = float(value)
+    return totals
+
+
+def read_url(path):
+    """Адрес эндпоинта чтения на WSGI- или на ASGI-сервере."""
+    if ASYNC_HOST:
+        return f'{ASYNC_HOST}/api/async/{path}'
+    return f'/api/{path}'
+
+
+def iter_postman_requests(items, folder=''):
+    """Отдает запросы коллекции Postman с названиями их папок."""
+    for item in items:
+        if 'item' in item:
+            yield from iter_postman_requests(item['item'], item['name'])
+        else:
+            yield folder, item['name'], item['request']
+
+
+def postman_read_tasks(path=POSTMAN_COLLECTION):
+    """Задачи locust из GET-запросов коллекции Postman.
+
+    Коллекция проверяет API по шагам: запросы на запись зависят от
+    состояния, созданного предыдущими шагами и ее скриптами, а после
+    прогона БД очищается `clear_db.sh`. Поэтому под нагрузку берутся
+    только запросы на чтение, кроме заведомо ошибочных и тех, для
+    переменных которых нет значения в `POSTMAN_VARIABLES`.
+    """
+    tasks, seen = [], set()
+    collection = json.loads(path.read_text('utf-8'))
+    for folder, name, request in iter_postman_requests(collection['item']):
+        url = request['url']
+        if isinstance(url, dict):
+            url = url['raw']
+        anonymous = name.partition('//')[2].strip() == 'No Auth'
+        if (
+            request['method'] != 'GET'
+            or 'bad_requests' in folder
+            or (url, anonymous) in seen
+            or not set(POSTMAN_VARIABLE.findall(url))
+            <= POSTMAN_VARIABLES.keys()
+        ):
+            continue
+        seen.add((url, anonymous))
+        tasks.append(postman_task(url, f'postman {name}', anonymous))
+    return tasks
+
+
+def postman_task(url, name, anonymous):
+    def task(user):
+        user.client.get(
+            POSTMAN_VARIABLE.sub(
+                lambda match: str(POSTMAN_VARIABLES[match[1]](user)), url
+            ),
+            # Заголовок со значением None requests не отправляет
+            headers={'Authorization': None} if anonymous else None,
+            name=name,
+        )
+    return task
+
+
+def log_in(user):
+    """Входит под случайным сгенерированным пользователем."""
+    number = random.randrange(SEED_USERS)
+    response = user.client.post('/api/auth/token/login/', json={
+        'email': f'{SEED_PREFIX}{number}@example.com',
+        'password': SEED_PASSWORD,
+    }, name='login')
+    token = response.json()['auth_token']
+    user.client.headers['Authorization'] = f'Token {token}'
+
+
+@events.test_start.add_listener
+def on_test_start(environment, **kwargs):
+    _metrics['before'] = read_query_metrics(environment.host)
+
+
+@events.test_stop.add_listener
+def on_test_stop(environment, **kwargs):
+    """Сохраняет среднее кол-во запросов к БД рядом с CSV-отчетом locust.
+
+    Если /metrics был недоступен в начале или в конце прогона, файл не
+    создается, и отчет показывает кол-во запросов как недоступное.
+    """
+    prefix = environment.parsed_options.csv_prefix
+    if not prefix:
+        return
+    path = Path(f'{prefix}_queries.json')
+    metrics_before = _metrics.get('before')
+    metrics = read_query_metrics(environment.host)
+    if metrics_before is None or metrics is None:
+        # Не оставляет в отчете счетчики прошлого прогона с тем же префиксом
+        path.unlink(missing_ok=True)
+        return
+    queries = {}
+    for key, after in metrics.items():
+        before = metrics_before.get(key, {})
+        count = after['count'] - before.get('count', 0)
+        if count:
+            queries[key] = (after['sum'] - before.get('sum', 0)) / count
+    path.write_text(json.dumps(queries, indent=2, sort_keys=True))
+
+
+class AnonymousVisitor(HttpUser):
+    """Гость: листает ленту, фильтрует по тегам и открывает рецепты."""
+
+    weight = 3
+    wait_time = between(0.5, 2)
+
+    def on_start(self):
+        self.recipe_ids = []
+
+    def open_feed(self, params, name):
+        response = self.client.get(
+            read_url('recipes/'), params=params, name=name
+        )
+        if response.ok:
+            self.recipe_ids = [
+                recipe['id'] for recipe in response.json()['results']
+            ] or self.recipe_ids
+
+    @task(6)
+    def feed(self):
+        self.open_feed(
+            {'page': random.randint(1, 50), 'limit': 6}, 'recipes-list'
+        )
+
+    @task(2)
+    def feed_cursor(self):
+        self.open_feed(
+            {'pagination': 'cursor', 'limit': 6}, 'recipes-list cursor'
+        )
+
+    @task(3)
+    def filter_by_tags(self):
+        self.open_feed(
+            {'tags': random.sample(TAGS, 2), 'limit': 6}, 'recipes-list tags'
+        )
+
+    @task(1)
+    def popular(self):
+        self.open_feed(
+            {'ordering': '-favorites_count', 'limit': 6},
+            'recipes-list ordering',
+        )
+
+    @task(1)
+    def search(self):
+        self.open_feed(
+            {'search': random.choice(SEARCH_TERMS), 'limit': 6},
+            'recipes-list search',
+        )
+
+    @task(4)
+    def detail(self):
+        if self.recipe_ids:
+            self.client.get(
+                read_url(f'recipes/{random.choice(self.recipe_ids)}/'),
+                name='recipes-detail',
+            )
+
+    @task(1)
+    def tags(self):
+        self.client.get(read_url('tags/'), name='tags-list')
+
+
+class SignedInCook(AnonymousVisitor):
+    """Пользователь: то же, что гость, плюс избранное, корзина и подписки."""
+
+    weight = 2
+
+    def on_start(self):
+        super().on_start()
+        log_in(self)
+
+    @task(2)
+    def favorites(self):
+        self.open_feed(
+            {'is_favorited': 1, 'limit': 6}, 'recipes-list is_favorited'
+        )
+
+    @task(2)
+    def autocomplete(self):
+        self.client.get(
+            read_url('ingredients/'),
+            params={'name': random.choice(INGREDIENT_PREFIXES)},
+            name='ingredients-list',
+        )
+
+    @task(1)
+    def download_shopping_cart(self):
+        self.client.get(
+            '/api/recipes/download_shopping_cart/',
+            name='recipes-download-shopping-cart',
+        )
+
+    @task(2)
+    def subscriptions(self):
+        self.client.get(
+            '/api/users/subscriptions/',
+            params={'recipes_limit': 3, 'limit': 6},
+            name='users-subscriptions',
+        )
+
+
+class PostmanReader(HttpUser):
+    """Запросы на чтение из коллекции Postman, по одному на каждый.
+
+    Дополняет основные сценарии эндпоинтами, которые проверяет коллекция:
+    новые запросы коллекции попадают под нагрузку без правки сценариев.
+    """
+
+    weight = 1
+    wait_time = between(0.5, 2)
+    tasks = postman_read_tasks()
+
+    def on_start(self):
+        log_in(self)
+        self.user_id = self.client.get(
+            '/api/users/me/', name='users-me'
+        ).json()['id']
+        self.tags = self.client.get('/api/tags/', name='tags-list').json()
+        self.recipe_ids = [
+            recipe['id'] for recipe in self.client.get(
+                '/api/recipes/', params={'limit': 50}, name='recipes-list'
+            ).json()['results']
+        ]
+        self.ingredient_ids = [
+            ingredient['id'] for ingredient in self.client.get(
+                '/api/ingredients/',
+                params={'name': random.choice(INGREDIENT_PREFIXES)},
+                name='ingredients-list',
+            ).json()
+        ]
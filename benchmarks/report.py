@@ -0,0 +1,115 @@
+"""Сводный отчет по прогону locust и сравнение отчетов разных коммитов.
+
+    python report.py collect results/run      # results/run.json
+    python report.py compare old.json new.json
+"""
+import argparse
+import csv
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+PERCENTILES = ('50%', '95%', '99%')
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ('git', 'rev-parse', '--short', 'HEAD'), text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def collect(prefix):
+    """Собирает перцентили из CSV locust и кол-во запросов к БД."""
+    endpoints = {}
+    with open(f'{prefix}_stats.csv', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            endpoints[row['Name']] = {
+                'requests': int(row['Request Count']),
+                'failures': int(row['Failure Count']),
+                'rps': float(row['Requests/s']),
+                **{
+                    f'p{percentile[:-1]}': float(row[percentile])
+                    for percentile in PERCENTILES
+                },
+            }
+    queries_path = Path(f'{prefix}_queries.json')
+    report = {
+        'revision': git_revision(),
+        'endpoints': endpoints,
+        # Без файла /metrics был недоступен во время прогона
+        'queries': (
+            json.loads(queries_path.read_text())
+            if queries_path.exists() else None
+        ),
+    }
+    Path(f'{prefix}.json').write_text(
+        json.dumps(report, indent=2, sort_keys=True, ensure_ascii=False)
+    )
+    print_report(report)
+
+
+def print_report(report):
+    print(f"Revision {report['revision']}")
+    print(f"{'Endpoint':40} {'req':>8} {'rps':>8} "
+          f"{'p50':>7} {'p95':>7} {'p99':>7}")
+    for name, stats in sorted(report['endpoints'].items()):
+        print(
+            f"{name:40} {stats['requests']:8} {stats['rps']:8.1f} "
+            f"{stats['p50']:7.0f} {stats['p95']:7.0f} {stats['p99']:7.0f}"
+        )
+    if report['queries'] is None:
+        print('\nDB queries: unavailable')
+        return
+    print(f"\n{'Endpoint':40} {'queries':>8}")
+    for name, queries in sorted(report['queries'].items()):
+        print(f'{name:40} {queries:8.1f}')
+
+
+def change(old, new):
+    if not old:
+        return '-'
+    return f'{(new - old) / old * 100:+.0f}%'
+
+
+def compare(old_path, new_path):
+    """Печатает изменение перцентилей и кол-ва запросов между отчетами."""
+    old = json.loads(Path(old_path).read_text())
+    new = json.loads(Path(new_path).read_text())
+    print(f"{old['revision']} -> {new['revision']}")
+    print(f"{'Endpoint':40} {'p50':>14} {'p95':>14} {'p99':>14}")
+    for name in sorted(old['endpoints'].keys() & new['endpoints'].keys()):
+        before, after = old['endpoints'][name], new['endpoints'][name]
+        print(f'{name:40} ' + ' '.join(
+            f"{after[key]:7.0f} {change(before[key], after[key]):>6}"
+            for key in ('p50', 'p95', 'p99')
+        ))
+    if old['queries'] is None or new['queries'] is None:
+        print('\nDB queries: unavailable')
+        return
+    print(f"\n{'Endpoint':40} {'queries':>14}")
+    for name in sorted(old['queries'].keys() & new['queries'].keys()):
+        before, after = old['queries'][name], new['queries'][name]
+        print(f'{name:40} {after:7.1f} {change(before, after):>6}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    collect_parser = commands.add_parser('collect')
+    collect_parser.add_argument('prefix', help='Значение --csv у locust')
+    compare_parser = commands.add_parser('compare')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    args = parser.parse_args()
+    if args.command == 'collect':
+        collect(args.prefix)
+    else:
+        compare(args.old, args.new)
+
+
+if __name__ == '__main__':
+    sys.exit(main())